@@ -1,10 +1,19 @@
+from startup import profiler, BackgroundLoad # first, so the startup clock includes every import
 import streamlit as st
-import pandas as pd
-import numpy as np 
-from tensorflow import keras
+import os
+import sys
+import time
 import process_user_input as ui
-import seaborn as sns
-import matplotlib.pyplot as plt
+import charts
+from prediction_cache import PredictionCache, ProbabilityTables, get_cache_key, get_model_version
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([os.path.join(root_dir, "pipeline"), os.path.join(root_dir, "model")])
+from pitcher_profiles import PitcherProfiles, PitcherLevelInfo
+import numpy_model
+from preprocessing import load_preprocessor
+model_path = "model/saved_models/fit_model_simple.h5"
+profile_dir = "data/pitcher_profiles" # built with pipeline/pitcher_profiles.py; not shipped
+pitcher_info_path = "data/pitcher_level_info_2022.csv" # shipped, so a fresh checkout runs on it
 
 ### Page Config ###
 st.set_page_config(
@@ -14,23 +23,39 @@ st.set_page_config(
 )
 
 ### Load Model + Data ###
-@st.cache
-def load_pitcher_data():
-    df = pd.read_csv("data/pitcher_level_info_2022.csv").set_index('pitcher_name')
-    return df
+@st.cache(allow_output_mutation=True)
+def load_pitcher_profiles():
+    profiles = PitcherProfiles(profile_dir) if os.path.isdir(profile_dir) else PitcherLevelInfo(pitcher_info_path)
+    return profiles
 
 @st.cache(allow_output_mutation=True)
-def load_model():
-    model = keras.models.load_model("model/saved_models/fit_model_simple.h5")
+def load_model(model_version):
+    model = BackgroundLoad(lambda: numpy_model.load_model(model_path), "model") # NumPy forward pass, no TensorFlow; warms while the widgets render
     return model
     
-pitcher_data = load_pitcher_data()
-pitch_types = ['fastball', 'curveball', 'sinker', 'cutter', 'changeup', 'slider', 'splitter', 'knuckle_curve', 'other']
-pitchers_lefty = pitcher_data['pitcher_lefty']
-pitchers_rates = pitcher_data[[f"{pitch}_rate" for pitch in pitch_types]]
-pitchers = sorted(list(pitchers_rates.index))
+@st.cache(allow_output_mutation=True)
+def load_model_preprocessor(model_version):
+    preprocessor = load_preprocessor(model_path) # feature order and encoding the model was trained with
+    return preprocessor
+
+@st.cache(allow_output_mutation=True)
+def load_prediction_cache():
+    cache = PredictionCache(maxsize=100_000, ttl=24*60*60) # one cache shared by every session
+    return cache
+
+@st.cache(allow_output_mutation=True)
+def load_probability_tables(model_version):
+    tables = ProbabilityTables("data/probability_tables.npz") if os.path.exists("data/probability_tables.npz") and os.path.isdir(profile_dir) else None # tabled by profile store IDs
+    return tables if tables is not None and tables.model_version == model_version else None # stale once the model is retrained
+
+model_version = get_model_version(model_path) # reloads the model, and misses cached predictions, after a retrain
+model = load_model(model_version)
+preprocessor = load_model_preprocessor(model_version)
+prediction_cache = load_prediction_cache()
+probability_tables = load_probability_tables(model_version)
 
-model = load_model()
+pitcher_profiles = load_pitcher_profiles()
+pitchers = pitcher_profiles.get_qualified_names()
 
 ### Page Content ###
 
@@ -53,10 +78,11 @@ with input:
     st.markdown("## Features")
     with st.expander("Pitcher/Batter"):
         pitcher = st.selectbox("Pitcher:", pitchers)
-        pitcher_lefty = pitchers_lefty[pitcher]
-        pitcher_rates = pitchers_rates.loc[pitcher]
+        pitcher_id = pitcher_profiles.get_id(pitcher)
+        pitcher_lefty = pitcher_profiles.is_lefty(pitcher_id)
+        pitcher_rates = pitcher_profiles.get_rates(pitcher_id)
         batter_hand = st.radio("Batter Hand", ['Righty', 'Lefty'])
-        lefties = [pitcher_lefty == "Lefty", batter_hand == "Lefty"]        
+        lefties = [pitcher_lefty, batter_hand == "Lefty"]        
     with st.expander("Game State"):
         home_score = st.number_input("Home Score", 0, 20)
         away_score = st.number_input("Away Score", 0, 20)
@@ -85,16 +111,20 @@ with input:
 with output:
     st.markdown("## Pitch Type Probabilities")
     # Create prediction 
-    X = ui.create_X(game_state, runners, scores, pitch_counts, lefties, pitcher_rates, balls, strikes)
-    X = np.array(X).reshape(1, -1)
-    pitch_type_probs = model.predict(X)[0]
+    inference_start = time.perf_counter()
+    pitch_type_probs = probability_tables.lookup(pitcher_id, game_state, runners, scores, pitch_counts, lefties, balls, strikes) if probability_tables else None
+    if pitch_type_probs is None:
+        X = preprocessor.transform(ui.create_inputs(game_state, runners, scores, pitch_counts, lefties, pitcher_rates, balls, strikes))
+        key = get_cache_key(game_state, runners, scores, pitch_counts, lefties, pitcher_rates, balls, strikes, model_version)
+        pitch_type_probs = prediction_cache.get_or_predict(key, lambda: model.result().predict(X)[0])
+    inference_time = time.perf_counter() - inference_start
+    profiler.mark("first_prediction")
 
     # Plot
-    fig, ax = plt.subplots(figsize=(7, 5))
-    palette = sns.color_palette("flare", 9)
-    sns.barplot(y=ui.pitch_types, x=pitch_type_probs, ax=ax, palette=palette)
-    ax.set_yticklabels([t.get_text().replace("_rate", "") for t in ax.get_yticklabels()], rotation=20)
-    ax.set_xlabel("Probability")
-    ax.grid()
-    sns.despine()
-    st.pyplot(fig)
+    render_start = time.perf_counter()
+    inputs = (pitcher, batter_hand, *game_state, *runners, *scores, *pitch_counts, balls, strikes)
+    charts.draw_probabilities(st, inputs, pitch_type_probs, ui.pitch_types, model_version)
+    render_time = time.perf_counter() - render_start
+    profiler.mark("first_chart")
+    cache_stats = prediction_cache.stats()
+    st.caption(f"Inference {1000*inference_time:.1f}ms · render {1000*render_time:.1f}ms · cache {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions")
@@ -0,0 +1,63 @@
+import io
+import os
+import threading
+import numpy as np
+from prediction_cache import PredictionCache
+
+## Style
+def get_palette(n, start=(0.93, 0.55, 0.42), end=(0.30, 0.12, 0.34)):
+    """Hex colors stepping from start to end (approximates seaborn's "flare" without importing seaborn)"""
+    colors = np.linspace(start, end, n)
+    return ["#" + "".join(f"{round(255*c):02x}" for c in color) for color in colors]
+
+chart_backend = os.environ.get("PITCHCAST_CHART", "vega") # "vega" (drawn by the browser) or "matplotlib" (SVG)
+chart_cache = PredictionCache(maxsize=1024) # charts by model version and app inputs, shared by every session
+
+## Vega-Lite
+def get_vega_spec(probs, labels):
+    """Vega-Lite bar chart spec of pitch type probabilities"""
+    return {
+        'data': {'values': [{'pitch_type': label, 'probability': prob} for label, prob in zip(labels, probs)]},
+        'mark': {'type': 'bar'},
+        'encoding': {
+            'y': {'field': 'pitch_type', 'type': 'nominal', 'sort': None, 'title': None, 'axis': {'labelAngle': -20}},
+            'x': {'field': 'probability', 'type': 'quantitative', 'title': 'Probability'},
+            'color': {'field': 'pitch_type', 'type': 'nominal', 'sort': None, 'legend': None, 'scale': {'domain': list(labels), 'range': get_palette(len(labels))}},
+            'tooltip': [{'field': 'pitch_type', 'type': 'nominal'}, {'field': 'probability', 'type': 'quantitative', 'format': '.3f'}],
+        },
+        'height': 350,
+    }
+
+## Matplotlib fallback
+figure = None # one figure, redrawn for each chart
+figure_lock = threading.Lock() # Streamlit runs sessions on separate threads
+
+def get_svg(probs, labels):
+    """Original horizontal bar chart as an SVG string, drawn on a reused figure (one session at a time)"""
+    global figure
+    with figure_lock:
+        if figure is None:
+            import matplotlib.pyplot as plt # only the matplotlib fallback needs it
+            figure = plt.figure(figsize=(7, 5))
+        figure.clear()
+        ax = figure.add_subplot()
+        ax.barh(labels, probs, color=get_palette(len(labels)))
+        ax.invert_yaxis()
+        ax.tick_params(axis='y', labelrotation=20)
+        ax.set_xlabel("Probability")
+        ax.grid()
+        ax.spines[['top', 'right']].set_visible(False)
+        buffer = io.StringIO()
+        figure.savefig(buffer, format="svg", bbox_inches="tight")
+        svg = buffer.getvalue()
+    return svg[svg.index("<svg"):] # drop the xml header so it can be inlined
+
+## Drawing
+def draw_probabilities(st, inputs, probs, labels, model_version=None):
+    """Draw the pitch type probability chart, reusing the chart already built for the same inputs and model"""
+    probs, labels = [float(prob) for prob in probs], tuple(labels)
+    key = (chart_backend, model_version, tuple(inputs), labels)
+    if chart_backend == "matplotlib":
+        st.markdown(chart_cache.get_or_predict(key, lambda: get_svg(probs, labels)), unsafe_allow_html=True)
+    else:
+        st.vega_lite_chart(chart_cache.get_or_predict(key, lambda: get_vega_spec(probs, labels)), use_container_width=True)
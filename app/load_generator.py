@@ -0,0 +1,101 @@
+import json
+import time
+import argparse
+import threading
+import urllib.request
+import numpy as np
+import process_user_input as ui
+from prediction_server import MicroBatcher, load_predict_fn
+
+## Requests
+def get_random_inputs(rng):
+    """Random create_X arguments within the app's input ranges"""
+    balls, strikes = int(rng.integers(4)), int(rng.integers(3))
+    ab_pitch_count = balls + strikes + int(rng.integers(3))
+    inning_pitch_count = ab_pitch_count + int(rng.integers(20))
+    rates = rng.dirichlet(np.ones(len(ui.pitch_types)))
+    return {
+        'game_state': [int(rng.integers(1, 10)), bool(rng.integers(2)), int(rng.integers(3))],
+        'runners': [bool(rng.integers(2)) for _ in range(3)],
+        'scores': [int(rng.integers(8)), int(rng.integers(8))],
+        'pitch_counts': [inning_pitch_count + int(rng.integers(80)), inning_pitch_count, ab_pitch_count],
+        'lefties': [bool(rng.integers(2)), bool(rng.integers(2))],
+        'pitcher_rates': rates.tolist(),
+        'balls': balls,
+        'strikes': strikes,
+    }
+
+def get_dummy_predict_fn(call_ms=20, n_features=34, seed=0):
+    """Stand-in for the model: fixed per-call overhead plus a softmax layer, to test batching without TensorFlow"""
+    weights = np.random.default_rng(seed).normal(size=(n_features, len(ui.pitch_types))).astype(np.float32)
+    def predict(X):
+        time.sleep(call_ms / 1000)
+        logits = X @ weights
+        logits -= logits.max(axis=1, keepdims=True)
+        return np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+    return predict
+
+## Load
+def run_load(send, n_clients=32, n_requests=2000, seed=0):
+    """Send n_requests from n_clients concurrent clients, returning per-request latencies and wall time"""
+    latencies = list()
+    lock = threading.Lock()
+    def client(client_id):
+        rng = np.random.default_rng(seed + client_id)
+        client_latencies = list()
+        for _ in range(n_requests // n_clients):
+            inputs = get_random_inputs(rng)
+            start = time.perf_counter()
+            send(inputs)
+            client_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(client_latencies)
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), time.perf_counter() - start
+
+def report(name, latencies, wall_time):
+    """Print latency percentiles and throughput"""
+    latencies_ms = latencies * 1000
+    print(f"{name:<32} {len(latencies)/wall_time:9.1f} req/s   p50 {np.percentile(latencies_ms, 50):8.2f}ms   p99 {np.percentile(latencies_ms, 99):8.2f}ms")
+
+def http_sender(url):
+    """Helper: send create_X arguments to a running prediction_server"""
+    def send(inputs):
+        request = urllib.request.Request(f"{url}/predict", data=json.dumps(inputs).encode(), headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+    return send
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-u", "--url", type=str, default=None, help="load a running prediction_server instead of an in-process batcher")
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    parser.add_argument("--backend", choices=['numpy', 'keras'], default='numpy')
+    parser.add_argument("-d", "--dummy", action='store_true', help="use a stand-in model instead of loading the saved one")
+    parser.add_argument("-c", "--clients", type=int, default=32)
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-b", "--max_batch_sizes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("-w", "--max_wait_ms", type=float, default=5)
+    args = parser.parse_args()
+
+    # Load a running server
+    if args.url is not None:
+        send = http_sender(args.url)
+        report(f"http ({args.clients} clients)", *run_load(send, args.clients, args.requests))
+        with urllib.request.urlopen(f"{args.url}/stats") as response:
+            print(json.dumps(json.loads(response.read()), indent=2))
+    else:
+        # Compare batch sizes in process (batch size 1 is one forward pass per request)
+        predict_fn = get_dummy_predict_fn() if args.dummy else load_predict_fn(args.model_path, args.backend)
+        for max_batch_size in args.max_batch_sizes:
+            batcher = MicroBatcher(predict_fn, max_batch_size, args.max_wait_ms)
+            send = lambda inputs: batcher.predict(ui.create_X(**inputs))
+            report(f"max_batch_size={max_batch_size}", *run_load(send, args.clients, args.requests))
+            stats = batcher.stats.summary()
+            print(f"{'':<32} mean batch {stats['mean_batch_size']:.1f}   forward pass {stats['forward_pass_mean_ms']:.2f}ms")
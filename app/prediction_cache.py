@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import argparse
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+import what_if
+
+## Canonical inputs
+def get_model_version(model_path):
+    """Short hash of a saved model and its preprocessing artifact"""
+    base_path = os.path.splitext(model_path)[0]
+    paths = (base_path + ".h5", base_path + "_preprocessing.json")
+    stamps = tuple((os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else None for path in paths)
+    return hash_files(paths, stamps)
+
+@lru_cache(maxsize=16)
+def hash_files(paths, stamps):
+    """Helper: short hash of the files that exist in paths (stamps only key the cache)"""
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def get_cache_key(game_state, runners, scores, pitch_counts, lefties, pitcher_rates, balls, strikes, model_version=None):
+    """Hashable key for create_X's inputs and the model scoring them"""
+    ints = tuple(int(value) for value in [*game_state, *runners, *scores, *pitch_counts, *lefties, balls, strikes])
+    return (model_version,) + ints + (np.asarray(pitcher_rates, dtype=np.float32).tobytes(),)
+
+## LRU/TTL cache
+class PredictionCache:
+    """Thread-safe LRU cache of predictions, with optional expiry after ttl seconds"""
+    def __init__(self, maxsize=10_000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # key -> (expires, probs), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Cached probabilities for key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, probs):
+        """Store probabilities for key, evicting the least recently used entry if full"""
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (expires, probs)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_predict(self, key, predict):
+        """Cached probabilities for key, calling predict() and caching its result on a miss"""
+        probs = self.get(key)
+        if probs is None:
+            probs = predict()
+            self.put(key, probs)
+        return probs
+
+    def stats(self):
+        """Counters as a dict"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+## Offline probability tables
+def build_probability_tables(model, preprocessor, pitcher_profiles, pitcher_ids, table_path, model_version=None):
+    """Score the what-if grid for each pitcher's latest rates and save it with the model version"""
+    pitcher_ids = np.sort(np.asarray(pitcher_ids, dtype=np.int64))
+    pitcher_lefty = [pitcher_profiles.is_lefty(pitcher_id) for pitcher_id in pitcher_ids]
+    pitcher_rates = [pitcher_profiles.get_rates(pitcher_id) for pitcher_id in pitcher_ids]
+    probs = what_if.score_grid(model, preprocessor, pitcher_rates, pitcher_lefty)
+    np.savez(table_path, pitcher_ids=pitcher_ids, probs=probs.astype(np.float32), model_version=np.array(model_version or ""))
+
+class ProbabilityTables:
+    """O(1) lookups into build_probability_tables output"""
+    def __init__(self, table_path):
+        with np.load(table_path) as arrays:
+            self.pitcher_ids = arrays['pitcher_ids']
+            self.probs = arrays['probs']
+            self.model_version = str(arrays['model_version']) if 'model_version' in arrays else None # None for tables built before versions were recorded
+
+    def lookup(self, pitcher_id, game_state, runners, scores, pitch_counts, lefties, balls, strikes):
+        """Tabled probabilities for these inputs, or None if the pitcher or the non-grid inputs aren't in the table"""
+        i = np.searchsorted(self.pitcher_ids, pitcher_id)
+        if i == len(self.pitcher_ids) or self.pitcher_ids[i] != pitcher_id:
+            return None
+        inning, top, outs = game_state
+        if (int(inning), bool(top), *map(int, scores)) != (1, True, 0, 0) or list(map(int, pitch_counts)) != [balls + strikes]*3:
+            return None
+        runner_index = int(runners[0]) + 2*int(runners[1]) + 4*int(runners[2])
+        return self.probs[i, int(lefties[1]), 3*balls + strikes, int(outs), runner_index]
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    parser.add_argument("-d", "--profile_dir", type=str, default="data/pitcher_profiles")
+    parser.add_argument("-n", "--n_pitchers", type=int, default=200, help="table the pitchers with the most pitches")
+    parser.add_argument("-o", "--output", type=str, default="data/probability_tables.npz")
+    args = parser.parse_args()
+
+    # Build tables for the most-used qualified pitchers
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.extend([os.path.join(root_dir, "pipeline"), os.path.join(root_dir, "model")])
+    from pitcher_profiles import PitcherProfiles
+    import numpy_model
+    from preprocessing import load_preprocessor
+    pitcher_profiles = PitcherProfiles(args.profile_dir)
+    qualified_ids = [pitcher_profiles.get_id(name) for name in pitcher_profiles.get_qualified_names()]
+    latest_totals = {pitcher_id: pitcher_profiles.totals[pitcher_profiles.offsets[pitcher_profiles.get_index(pitcher_id) + 1] - 1] for pitcher_id in qualified_ids}
+    pitcher_ids = sorted(qualified_ids, key=latest_totals.get, reverse=True)[:args.n_pitchers]
+    start = time.perf_counter()
+    build_probability_tables(numpy_model.load_model(args.model_path), load_preprocessor(args.model_path), pitcher_profiles, pitcher_ids, args.output, get_model_version(args.model_path))
+    print(f"Tabled {len(pitcher_ids)} pitchers in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import process_user_input as ui
+from prediction_cache import PredictionCache, get_cache_key, get_model_version
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model"))
+
+## Stats
+class ServerStats:
+    """Latency and throughput counters, safe to update from several threads"""
+    def __init__(self, window=10_000):
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window) # seconds, most recent requests
+        self.batch_times = deque(maxlen=window) # seconds per forward pass
+
+    def record_batch(self, latencies, batch_time, failed=False):
+        """Record one forward pass and the latency of each request in it"""
+        with self.lock:
+            self.batches += 1
+            self.requests += len(latencies)
+            self.errors += len(latencies) if failed else 0
+            self.latencies.extend(latencies)
+            self.batch_times.append(batch_time)
+
+    def summary(self):
+        """Counters as a dict (latencies in ms)"""
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            batch_times = np.array(self.batch_times) * 1000
+            uptime = time.monotonic() - self.start_time
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'errors': self.errors,
+                'mean_batch_size': self.requests / self.batches if self.batches else 0,
+                'requests_per_second': self.requests / uptime,
+                'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                'forward_pass_mean_ms': float(batch_times.mean()) if len(batch_times) else None,
+            }
+
+## Micro-batching
+class MicroBatcher:
+    """Run single-row requests through predict_fn in batches"""
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5, n_features=None, timeout=10):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.n_features = n_features # row width predict_fn takes (unchecked if None)
+        self.timeout = timeout # default seconds predict() waits for a batch
+        self.queue = queue.Queue()
+        self.stats = ServerStats()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, x):
+        """Queue one feature row, returning a Future for its probabilities"""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim != 1 or (self.n_features is not None and len(x) != self.n_features):
+            raise ValueError(f"expected one row of {self.n_features or 'any number of'} features, got shape {x.shape}")
+        future = Future()
+        self.queue.put((x, future, time.monotonic()))
+        return future
+
+    def predict(self, x, timeout=None):
+        """Probabilities for one feature row (blocks until its batch has run)"""
+        return self.submit(x).result(timeout if timeout is not None else self.timeout)
+
+    def get_batch(self):
+        """Helper: wait for a request, then gather more until the batch is full or the wait is up"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        """Worker loop: one forward pass per batch"""
+        while True:
+            batch = self.get_batch()
+            batch_start = time.monotonic()
+            try:
+                X = np.vstack([x for x, _, _ in batch])
+                probs = self.predict_fn(X)
+                if len(probs) != len(batch):
+                    raise ValueError(f"predict_fn returned {len(probs)} rows for a batch of {len(batch)}")
+                failed = False
+            except Exception as e: # fail this batch's requests, not the worker
+                probs, failed = [e] * len(batch), True
+            done = time.monotonic()
+            for (_, future, submitted), prob in zip(batch, probs):
+                if future.done(): # cancelled by its caller
+                    continue
+                if failed:
+                    future.set_exception(prob)
+                else:
+                    future.set_result(prob)
+            self.stats.record_batch([done - submitted for _, _, submitted in batch], done - batch_start, failed)
+
+def load_predict_fn(model_path, backend='numpy'):
+    """Load the saved model and return a batch predict function (NumPy forward pass, or Keras)"""
+    if backend == 'numpy':
+        import numpy_model
+        return numpy_model.load_model(model_path).predict
+    from tensorflow import keras
+    model = keras.models.load_model(model_path)
+    return lambda X: model(X, training=False).numpy() # skips model.predict's per-call setup
+
+## HTTP
+class PredictionServer(ThreadingHTTPServer):
+    request_queue_size = 128 # the default of 5 makes bursts of clients wait on tcp retries
+    daemon_threads = True
+
+def make_handler(batcher, cache=None, preprocessor=None, model_version=None):
+    """Build a request handler serving POST /predict and GET /stats"""
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/predict":
+                return self.send_json({'error': f"unknown path {self.path}"}, 404)
+            try:
+                inputs = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if 'columns' in inputs:
+                    if preprocessor is None:
+                        raise ValueError("no preprocessing artifact for this model")
+                    predict = lambda: batcher.predict(preprocessor.transform(inputs['columns'])[0])
+                    key = (model_version,) + tuple(sorted((column, str(value)) for column, value in inputs['columns'].items()))
+                else:
+                    predict = lambda: batcher.predict(ui.create_X(**inputs))
+                    key = get_cache_key(**inputs, model_version=model_version)
+                probs = cache.get_or_predict(key, predict) if cache is not None else predict()
+            except TimeoutError:
+                return self.send_json({'error': "timed out waiting for the model"}, 503)
+            except Exception as e:
+                return self.send_json({'error': str(e)}, 400)
+            self.send_json({'probabilities': dict(zip(ui.pitch_types, probs.tolist()))})
+
+        def do_GET(self):
+            if self.path != "/stats":
+                return self.send_json({'error': f"unknown path {self.path}"}, 404)
+            stats = batcher.stats.summary()
+            if cache is not None:
+                stats['cache'] = cache.stats()
+            self.send_json(stats)
+
+        def send_json(self, body, status=200):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass # per-request logging costs more than the prediction
+
+    return PredictionHandler
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    parser.add_argument("-p", "--port", type=int, default=8502)
+    parser.add_argument("--backend", choices=['numpy', 'keras'], default='numpy')
+    parser.add_argument("-b", "--max_batch_size", type=int, default=64)
+    parser.add_argument("-w", "--max_wait_ms", type=float, default=5)
+    parser.add_argument("-c", "--cache_size", type=int, default=100_000, help="0 disables the prediction cache")
+    parser.add_argument("--cache_ttl", type=float, default=None, help="seconds before a cached prediction expires")
+    parser.add_argument("-t", "--timeout", type=float, default=10, help="seconds a request waits for its batch before failing")
+    args = parser.parse_args()
+
+    # Serve
+    from preprocessing import get_preprocessing_path, load_preprocessor
+    preprocessor = load_preprocessor(args.model_path) if os.path.exists(get_preprocessing_path(args.model_path)) else None
+    n_features = len(preprocessor.features) if preprocessor is not None else len(ui.get_features())
+    batcher = MicroBatcher(load_predict_fn(args.model_path, args.backend), args.max_batch_size, args.max_wait_ms, n_features, args.timeout)
+    cache = PredictionCache(args.cache_size, args.cache_ttl) if args.cache_size > 0 else None
+    server = PredictionServer(("127.0.0.1", args.port), make_handler(batcher, cache, preprocessor, get_model_version(args.model_path)))
+    print(f"Serving predictions on http://127.0.0.1:{args.port}/predict (stats at /stats)")
+    server.serve_forever()
@@ -28,9 +28,17 @@ def get_features():
     return features
 
 def create_X(game_state, runners, scores, pitch_counts, lefties, pitcher_rates, balls, strikes):
-    """Create single sample for prediction"""
+    """Create single sample for prediction (pitcher_rates in pitch_types order)"""
     
-    pitch_rates = list(pitcher_rates[[f"{pitch}_rate" for pitch in pitch_types]])
+    pitch_rates = list(pitcher_rates)
     count_dummies = [int(count == f"count_({balls}, {strikes})") for count in counts]
     features = game_state + runners + scores + pitch_counts + lefties + pitch_rates + count_dummies
-    return features
\ No newline at end of file
+    return features
+
+def create_inputs(game_state, runners, scores, pitch_counts, lefties, pitcher_rates, balls, strikes):
+    """Single sample as season store columns, for a model's preprocessing artifact (same arguments as create_X)"""
+    names = ['inning', 'top', 'outs', 'runner_1', 'runner_2', 'runner_3', 'home_score', 'away_score', 'pitch_count', 'inning_pitch_count', 'ab_pitch_count', 'pitcher_lefty', 'batter_lefty']
+    inputs = dict(zip(names, game_state + runners + scores + pitch_counts + lefties))
+    inputs.update(zip([pitch_type + "_rate" for pitch_type in pitch_types], pitcher_rates))
+    inputs['count'] = f"({balls},{strikes})"
+    return inputs
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from prediction_server import MicroBatcher, load_predict_fn
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([os.path.join(root_dir, "pipeline"), os.path.join(root_dir, "model")])
+from online_features import OnlineFeatures, get_feature_names
+from feature_engineering import get_clean_pitch_type
+from add_pitch_rates import get_pitcher_pitch_counts
+from memory import get_rss_mb
+
+## Schedule
+def load_season(season_path):
+    """Read a season store (parquet or csv, as pipeline/main.py writes it)"""
+    if season_path.endswith(".csv"):
+        return pd.read_csv(season_path)
+    return pd.read_parquet(season_path)
+
+def get_synthetic_season(n_games):
+    """Raw dataframe of n_games synthetic games (15 a day, so the first 15 are one game day)"""
+    import synthetic, convert_to_dataframe
+    return convert_to_dataframe.create_raw_data_frame(synthetic.get_synthetic_season_data(n_games))
+
+def schedule_pitches(season_df, pitch_seconds=20, date=None, n_games=None):
+    """Pitches of one game day in live-feed order, with the time each was thrown"""
+    df = season_df.copy()
+    if 'raw_pitch_type' in df.columns:
+        df['pitch_type'] = df['raw_pitch_type'] # season stores keep the api's pitch type here; online features clean it again
+    df['start_time'] = pd.to_datetime(df['start_time'].astype(str).str.slice(0, 19))
+    first_pitch = df.groupby('game_id')['start_time'].transform('min')
+    df['date'] = first_pitch.dt.strftime("%Y-%m-%d")
+    date = date if date is not None else df.groupby('date')['game_id'].nunique()[::-1].idxmax() # latest, so pitchers have the most history
+    df = df[df['date'] == date]
+    if n_games is not None:
+        game_ids = first_pitch.loc[df.index].groupby(df['game_id']).min().sort_values(kind='stable').index[:n_games]
+        df = df[df['game_id'].isin(game_ids)]
+    if df.empty:
+        raise ValueError(f"No games on {date}")
+    nth_pitch = df.groupby(['game_id', 'at_bat_index']).cumcount()
+    game_time = (df['start_time'] - df['start_time'].min()).dt.total_seconds() + pitch_seconds * nth_pitch
+    df['game_time'] = game_time.groupby(df['game_id']).cummax() # keep each game's pitches in order
+    df['last_pitch'] = ~df['game_id'].duplicated(keep='last')
+    return df.sort_values('game_time', kind='stable').reset_index(drop=True) # stable, so ties keep pitch order
+
+def get_prior_counts(season_df, date):
+    """Each pitcher's pitch type counts from the season's games before date, as add_pitch_rates counts them"""
+    start_time = pd.to_datetime(season_df['start_time'].astype(str).str.slice(0, 19))
+    earlier = (start_time.groupby(season_df['game_id']).transform('min').dt.strftime("%Y-%m-%d") < date).to_numpy()
+    raw_pitch_types = season_df['raw_pitch_type' if 'raw_pitch_type' in season_df.columns else 'pitch_type'][earlier]
+    return get_pitcher_pitch_counts(pd.DataFrame({'pitcher_id': season_df['pitcher_id'][earlier], 'pitch_type': raw_pitch_types.astype(str).map(get_clean_pitch_type)}))
+
+## Replay
+class Replay:
+    """Re-emit scheduled pitches in real time, scoring each through the batcher"""
+    def __init__(self, schedule, batcher, preprocessor=None, speedup=60, min_pitches=100, interval=5, prior_counts=None):
+        self.schedule = schedule
+        self.batcher = batcher
+        self.preprocessor = preprocessor
+        self.speedup = speedup
+        self.interval = interval
+        feature_names = preprocessor.features if preprocessor is not None else None
+        self.online_features = OnlineFeatures(feature_names, simple=True, min_pitches=min_pitches)
+        if prior_counts is not None:
+            self.online_features.load_counts(prior_counts)
+        self.lock = threading.Lock()
+        self.latencies = list() # (done, seconds) per pitch, in order of completion
+        self.feature_times = list() # seconds per feature vector
+        self.errors = 0
+        self.non_finite = 0 # pitches scored with NaN or infinite probabilities
+        self.timeline = list()
+
+    def record(self, due, future):
+        """Helper: future callback, run on the batcher's thread"""
+        done = time.perf_counter()
+        with self.lock:
+            if future.exception() is not None:
+                self.errors += 1
+            else:
+                self.non_finite += not np.isfinite(future.result()).all()
+                self.latencies.append((done - self.start, done - due))
+
+    def sample(self, last):
+        """Helper: append one timeline point covering the pitches finished since the last"""
+        now = time.perf_counter() - self.start
+        with self.lock:
+            window = [latency for done, latency in self.latencies[last['finished']:]]
+            finished = len(self.latencies)
+        window_ms = np.array(window) * 1000
+        point = {
+            'seconds': now,
+            'pitches': finished,
+            'pitches_per_second': len(window) / (now - last['seconds']) if now > last['seconds'] else 0,
+            'latency_p50_ms': float(np.percentile(window_ms, 50)) if len(window_ms) else None,
+            'latency_p99_ms': float(np.percentile(window_ms, 99)) if len(window_ms) else None,
+            'rss_mb': get_rss_mb(),
+            'games_tracked': len(self.online_features.games),
+            'pitchers_tracked': len(self.online_features.pitcher_totals),
+        }
+        self.timeline.append(point)
+        p50, p99 = (f"{point[key]:8.2f}ms" if point[key] is not None else f"{'-':>10}" for key in ('latency_p50_ms', 'latency_p99_ms'))
+        print(f"{now:8.1f}s {finished:>8} pitches {point['pitches_per_second']:9.1f}/s   p50 {p50}   p99 {p99}   rss {point['rss_mb']:7.1f}MB")
+        return {'seconds': now, 'finished': finished}
+
+    def run(self, max_pitches=None):
+        """Replay the schedule and return the summary report"""
+        pitches = self.schedule.head(max_pitches).to_dict('records')
+        self.start = time.perf_counter()
+        last = self.sample({'seconds': 0, 'finished': 0})
+        next_sample = self.interval
+        for pitch in pitches:
+            due = self.start + pitch['game_time'] / self.speedup if self.speedup else time.perf_counter() # as fast as possible: latency from emit
+            while True:
+                now = time.perf_counter()
+                if now - self.start >= next_sample:
+                    last = self.sample(last)
+                    next_sample += self.interval
+                if now >= due:
+                    break
+                time.sleep(min(due, self.start + next_sample) - now)
+            feature_start = time.perf_counter()
+            x = self.online_features.features(pitch)
+            if self.preprocessor is not None and self.preprocessor.mean is not None:
+                x = (x - self.preprocessor.mean) / self.preprocessor.scale
+            self.feature_times.append(time.perf_counter() - feature_start)
+            self.batcher.submit(x).add_done_callback(lambda future, due=due: self.record(due, future))
+            self.online_features.update(pitch['pitch_type'], pitch['game_id']) # the pitch has been thrown
+            if pitch['last_pitch']:
+                self.online_features.end_game(pitch['game_id'])
+        while len(self.latencies) + self.errors < len(pitches):
+            time.sleep(0.001)
+        self.sample(last)
+        report = self.report()
+        if self.non_finite:
+            raise ValueError(f"{self.non_finite} of {report['pitches']} pitches got non-finite probabilities (pitchers under min_pitches have NaN rates); replay a later date or give prior counts")
+        return report
+
+    def report(self):
+        """Summary of the replay plus the timeline"""
+        wall_time = time.perf_counter() - self.start
+        latencies_ms = np.array([latency for _, latency in self.latencies]) * 1000
+        feature_us = np.array(self.feature_times) * 1e6
+        stats = self.batcher.stats.summary()
+        return {
+            'pitches': len(self.latencies) + self.errors,
+            'games': int(self.schedule['game_id'].nunique()),
+            'speedup': self.speedup,
+            'errors': self.errors,
+            'non_finite': self.non_finite,
+            'wall_seconds': wall_time,
+            'pitches_per_second': len(self.latencies) / wall_time,
+            'latency_p50_ms': float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+            'latency_p99_ms': float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None,
+            'latency_max_ms': float(latencies_ms.max()) if len(latencies_ms) else None,
+            'features_p50_us': float(np.percentile(feature_us, 50)) if len(feature_us) else None,
+            'features_p99_us': float(np.percentile(feature_us, 99)) if len(feature_us) else None,
+            'mean_batch_size': stats['mean_batch_size'],
+            'forward_pass_mean_ms': stats['forward_pass_mean_ms'],
+            'peak_rss_mb': max(point['rss_mb'] for point in self.timeline),
+            'timeline': self.timeline,
+        }
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--season_path", type=str, default=None, help="season store to replay (pipeline/main.py output)")
+    parser.add_argument("--synthetic", type=int, default=None, help="replay the last day of this many synthetic games instead of a season store (600 or so, so pitchers reach min_pitches)")
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    parser.add_argument("--backend", choices=['numpy', 'keras'], default='numpy')
+    parser.add_argument("-d", "--date", type=str, default=None, help="game day to replay, YYYY-MM-DD (default: the latest day with the most games)")
+    parser.add_argument("-g", "--games", type=int, default=15, help="replay that day's first games only")
+    parser.add_argument("-x", "--speedup", type=float, default=60, help="game seconds per wall second (0 replays as fast as possible)")
+    parser.add_argument("--pitch_seconds", type=float, default=20, help="game time between pitches of an at bat")
+    parser.add_argument("-n", "--max_pitches", type=int, default=None)
+    parser.add_argument("-b", "--max_batch_size", type=int, default=64)
+    parser.add_argument("-w", "--max_wait_ms", type=float, default=5)
+    parser.add_argument("-p", "--prior_counts", type=str, default=None, help="last season's pitch counts (data/pitch_counts_<season>.csv), for a season built with carried rates")
+    parser.add_argument("-i", "--interval", type=float, default=5, help="seconds between timeline points")
+    parser.add_argument("-o", "--output", type=str, default=None, help="write the report as JSON")
+    args = parser.parse_args()
+    if (args.season_path is None) == (args.synthetic is None):
+        parser.error("give one of --season_path or --synthetic")
+
+    # Schedule the day's pitches
+    season_df = load_season(args.season_path) if args.season_path else get_synthetic_season(args.synthetic)
+    schedule = schedule_pitches(season_df, args.pitch_seconds, args.date, args.games)
+    game_hours = schedule['game_time'].iloc[-1] / 3600
+    print(f"{len(schedule)} pitches from {schedule['game_id'].nunique()} games ({game_hours:.1f} game hours, {game_hours*3600/args.speedup/60 if args.speedup else 0:.1f} wall minutes at {args.speedup:g}x)")
+
+    # Replay and report
+    from preprocessing import get_preprocessing_path, load_preprocessor
+    preprocessor = load_preprocessor(args.model_path) if os.path.exists(get_preprocessing_path(args.model_path)) else None
+    n_features = len(preprocessor.features) if preprocessor is not None else len(get_feature_names(simple=True))
+    batcher = MicroBatcher(load_predict_fn(args.model_path, args.backend), args.max_batch_size, args.max_wait_ms, n_features)
+    prior_counts = get_prior_counts(season_df, schedule['date'].iloc[0]) # the season's games before the day, so rates are warm before the clock starts
+    if args.prior_counts:
+        prior_counts = prior_counts.add(pd.read_csv(args.prior_counts, index_col='pitcher_id'), fill_value=0)
+    report = Replay(schedule, batcher, preprocessor, args.speedup, interval=args.interval, prior_counts=prior_counts).run(args.max_pitches)
+    print(json.dumps({key: value for key, value in report.items() if key != 'timeline'}, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+## Cold-start profiling
+class StartupProfiler:
+    """Record when startup events happen, in seconds since this module was imported"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.events = dict() # event -> seconds since start
+        self.report_path = os.environ.get("PITCHCAST_STARTUP_REPORT")
+
+    def mark(self, event):
+        """Record the first time an event happens"""
+        if event not in self.events:
+            self.events[event] = time.perf_counter() - self.start
+            if self.report_path:
+                self.write(self.report_path)
+
+    def report(self):
+        """Events as a dict (seconds since start)"""
+        return {'events': self.events}
+
+    def write(self, path):
+        """Write the report as JSON"""
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+profiler = StartupProfiler()
+
+## Background loads
+class BackgroundLoad:
+    """Run a slow load on a background thread; result() waits for it"""
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup")
+
+    def __init__(self, load, name):
+        self.name = name
+        self.future = self.executor.submit(self.run, load)
+
+    def run(self, load):
+        """Helper: load and record when it finished"""
+        result = load()
+        profiler.mark(f"{self.name}_loaded")
+        return result
+
+    def result(self):
+        """The loaded object (blocks until it is ready)"""
+        return self.future.result()
+
+## Headless first prediction
+def run_first_prediction(backend="numpy", model_path="model/saved_models/fit_model_simple.h5", pitcher_info_path="data/pitcher_level_info_2022.csv"):
+    """Helper: the app's path to its first prediction and chart without Streamlit, with the widgets' default inputs"""
+    import process_user_input as ui
+    import charts
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.extend([os.path.join(root_dir, "pipeline"), os.path.join(root_dir, "model")])
+    from pitcher_profiles import PitcherLevelInfo
+    from preprocessing import load_preprocessor
+    if backend == "numpy":
+        import numpy_model
+        model = BackgroundLoad(lambda: numpy_model.load_model(model_path), "model")
+    else: # how the app loaded its model before the NumPy forward pass
+        from tensorflow import keras
+        model = BackgroundLoad(lambda: keras.models.load_model(model_path), "model")
+    preprocessor = load_preprocessor(model_path)
+    pitcher_profiles = PitcherLevelInfo(pitcher_info_path)
+    pitcher_id = pitcher_profiles.get_id(pitcher_profiles.get_qualified_names()[0])
+    game_state, runners, scores, pitch_counts = [1, True, 0], [False, False, False], [0, 0], [0, 0, 0]
+    lefties = [pitcher_profiles.is_lefty(pitcher_id), False]
+    X = preprocessor.transform(ui.create_inputs(game_state, runners, scores, pitch_counts, lefties, pitcher_profiles.get_rates(pitcher_id), 0, 0))
+    pitch_type_probs = model.result().predict(X)[0]
+    profiler.mark("first_prediction")
+    charts.get_vega_spec(pitch_type_probs, ui.pitch_types)
+    profiler.mark("first_chart")
+
+## Cold-start measurement in a fresh interpreter
+def parse_import_times(stderr, top=15):
+    """Helper: the slowest top-level imports (seconds, cumulative) from python -X importtime output"""
+    imports = dict()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "): # nested imports are indented
+            imports[name.strip()] = int(cumulative) / 1e6
+    return dict(sorted(imports.items(), key=lambda item: item[1], reverse=True)[:top])
+
+def measure_cold_start(app_path="app/app.py", headless_backend=None):
+    """Run the app (or a headless first prediction) in a fresh interpreter; return its import times and events"""
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report_path = os.path.join(tmp_dir, "startup.json")
+        env = dict(os.environ, PITCHCAST_STARTUP_REPORT=report_path)
+        start = time.perf_counter()
+        script = [os.path.abspath(__file__), "--run_headless", headless_backend] if headless_backend else [app_path]
+        result = subprocess.run([sys.executable, "-X", "importtime", *script], capture_output=True, text=True, cwd=root_dir, env=env)
+        wall_time = time.perf_counter() - start
+        if result.returncode != 0 or not os.path.exists(report_path):
+            raise RuntimeError(f"Cold start failed:\n{result.stderr[-5000:]}")
+        with open(report_path, "r") as f:
+            events = json.load(f)['events']
+    return {'imports': parse_import_times(result.stderr), 'events': events, 'wall_seconds': wall_time}
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", "--app_path", type=str, default="app/app.py")
+    parser.add_argument("-o", "--output", type=str, default=None, help="write the report as JSON")
+    parser.add_argument("--headless", choices=['numpy', 'keras'], default=None, help="time the app's first prediction with this backend, without Streamlit")
+    parser.add_argument("--run_headless", choices=['numpy', 'keras'], default=None, help=argparse.SUPPRESS) # the measured child process
+    args = parser.parse_args()
+
+    # Run the first prediction in this process
+    if args.run_headless:
+        run_first_prediction(args.run_headless)
+        sys.exit(0)
+
+    # Measure and report
+    report = measure_cold_start(args.app_path, args.headless)
+    for name, seconds in report['imports'].items():
+        print(f"import {name:<28} {1000*seconds:9.1f}ms")
+    for event, seconds in report['events'].items():
+        print(f"{event:<35} {1000*seconds:9.1f}ms since startup.py was imported")
+    print(f"{'process wall time':<35} {1000*report['wall_seconds']:9.1f}ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import process_user_input as ui
+
+## Scenario grid
+grid_dims = ['pitcher', 'batter_lefty', 'count', 'outs', 'runners', 'pitch_type']
+grid_counts = [(balls, strikes) for balls in range(4) for strikes in range(3)] # same order as ui.counts
+grid_runners = [(runner_1, runner_2, runner_3) for runner_3 in (0, 1) for runner_2 in (0, 1) for runner_1 in (0, 1)] # index = runner_1 + 2*runner_2 + 4*runner_3
+
+def get_grid_cells(batter_lefty=(False, True)):
+    """Helper: one row per batter hand x count x outs x runners cell, in grid order, as int arrays"""
+    hand, count, outs, runners = np.meshgrid(np.arange(len(batter_lefty)), np.arange(len(grid_counts)), np.arange(3), np.arange(len(grid_runners)), indexing='ij')
+    hand, count, outs, runners = hand.ravel(), count.ravel(), outs.ravel(), runners.ravel()
+    balls, strikes = np.array(grid_counts).T
+    runner_values = np.array(grid_runners)
+    return {
+        'batter_lefty': np.array(batter_lefty, dtype=int)[hand],
+        'count': count,
+        'balls': balls[count],
+        'strikes': strikes[count],
+        'outs': outs,
+        'runner_1': runner_values[runners, 0],
+        'runner_2': runner_values[runners, 1],
+        'runner_3': runner_values[runners, 2],
+    }
+
+def create_inputs_grid(pitcher_rates, pitcher_lefty, batter_lefty=(False, True), inning=1, top=True, scores=(0, 0)):
+    """Season store columns for every pitcher x scenario cell, in grid order"""
+    pitcher_rates = np.asarray(pitcher_rates, dtype=np.float32).reshape(-1, len(ui.pitch_types))
+    pitcher_lefty = np.asarray(pitcher_lefty, dtype=np.float32).reshape(-1)
+    cells = get_grid_cells(batter_lefty)
+    n_pitchers, n_cells = len(pitcher_rates), len(cells['count'])
+    n_rows = n_pitchers * n_cells
+    count_levels = np.array([f"({balls},{strikes})" for balls, strikes in grid_counts])
+    inputs = {
+        'inning': np.full(n_rows, inning),
+        'top': np.full(n_rows, top),
+        'home_score': np.full(n_rows, scores[0]),
+        'away_score': np.full(n_rows, scores[1]),
+        'count': np.tile(count_levels[cells['count']], n_pitchers),
+        'pitcher_lefty': np.repeat(pitcher_lefty, n_cells),
+    }
+    for name in ('outs', 'runner_1', 'runner_2', 'runner_3', 'batter_lefty'):
+        inputs[name] = np.tile(cells[name], n_pitchers)
+    for name in ('pitch_count', 'inning_pitch_count', 'ab_pitch_count'):
+        inputs[name] = np.tile(cells['balls'] + cells['strikes'], n_pitchers)
+    for i, pitch_type in enumerate(ui.pitch_types):
+        inputs[pitch_type + "_rate"] = np.repeat(pitcher_rates[:, i], n_cells)
+    return inputs
+
+def create_X_grid(preprocessor, pitcher_rates, pitcher_lefty, batter_lefty=(False, True), **fixed):
+    """Feature rows for every pitcher x scenario cell, through the model's preprocessor"""
+    inputs = create_inputs_grid(pitcher_rates, pitcher_lefty, batter_lefty, **fixed)
+    missing = [column for column in preprocessor.input_columns if column not in inputs]
+    if missing:
+        raise ValueError(f"The what-if grid only fills the simple model's inputs, not {missing}")
+    return preprocessor.transform(inputs)
+
+def score_grid(model, preprocessor, pitcher_rates, pitcher_lefty, batter_lefty=(False, True), **fixed):
+    """Probabilities for every cell in one forward pass, shaped like grid_dims: (pitchers, hands, 12, 3, 8, 9)"""
+    X = create_X_grid(preprocessor, pitcher_rates, pitcher_lefty, batter_lefty, **fixed)
+    probs = model.predict(X)
+    return probs.reshape(-1, len(batter_lefty), len(grid_counts), 3, len(grid_runners), len(ui.pitch_types))
+
+def grid_to_frame(pitcher_names, probs, batter_lefty=(False, True)):
+    """Tidy table of score_grid output: one row per pitcher x cell, one probability column per pitch type"""
+    import pandas as pd
+    cells = get_grid_cells(batter_lefty)
+    n_cells = len(cells['count'])
+    frame = pd.DataFrame({'pitcher_name': np.repeat(np.asarray(pitcher_names, dtype=object), n_cells)})
+    for name in ('batter_lefty', 'balls', 'strikes', 'outs', 'runner_1', 'runner_2', 'runner_3'):
+        frame[name] = np.tile(cells[name], len(pitcher_names)).astype(np.int8)
+    frame[ui.pitch_types] = probs.reshape(-1, len(ui.pitch_types))
+    return frame
+
+## Pitcher inputs
+def load_pitcher_inputs(source):
+    """Names, handedness and rates of every qualified pitcher"""
+    if os.path.isdir(source):
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        sys.path.append(os.path.join(root_dir, "pipeline"))
+        from pitcher_profiles import PitcherProfiles
+        pitcher_profiles = PitcherProfiles(source)
+        names = pitcher_profiles.get_qualified_names()
+        pitcher_ids = [pitcher_profiles.get_id(name) for name in names]
+        lefty = np.array([pitcher_profiles.is_lefty(pitcher_id) for pitcher_id in pitcher_ids])
+        rates = np.array([pitcher_profiles.get_rates(pitcher_id) for pitcher_id in pitcher_ids]).reshape(-1, len(ui.pitch_types))
+        return names, lefty, rates
+    import pandas as pd
+    pitcher_info = pd.read_csv(source).sort_values('pitcher_name')
+    return pitcher_info['pitcher_name'].tolist(), pitcher_info['pitcher_lefty'].to_numpy(dtype=bool), pitcher_info[[pitch_type + "_rate" for pitch_type in ui.pitch_types]].to_numpy(dtype=np.float32)
+
+## Streaming
+def score_pitchers(model, preprocessor, names, lefty, rates, output_path, chunk_size=100):
+    """Score the grid chunk_size pitchers at a time, appending each chunk to output_path"""
+    writer = None
+    for start in range(0, len(names), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        frame = grid_to_frame(names[chunk], score_grid(model, preprocessor, rates[chunk], lefty[chunk]))
+        if output_path.endswith(".parquet"):
+            import pyarrow as pa, pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            writer = writer or pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+        else:
+            frame.to_csv(output_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    if writer is not None:
+        writer.close()
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    parser.add_argument("-s", "--source", type=str, default="data/pitcher_profiles", help="pitcher_profiles directory or pitcher_level_info csv")
+    parser.add_argument("-o", "--output", type=str, default="data/what_if.parquet")
+    parser.add_argument("-c", "--chunk_size", type=int, default=100, help="pitchers per forward pass")
+    args = parser.parse_args()
+
+    # Score every pitcher
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model"))
+    import numpy_model
+    from preprocessing import load_preprocessor
+    start = time.perf_counter()
+    names, lefty, rates = load_pitcher_inputs(args.source)
+    score_pitchers(numpy_model.load_model(args.model_path), load_preprocessor(args.model_path), names, lefty, rates, args.output, args.chunk_size)
+    print(f"Scored {len(names)} pitchers x {2*len(grid_counts)*3*len(grid_runners)} scenarios in {time.perf_counter() - start:.1f}s")
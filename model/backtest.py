@@ -0,0 +1,151 @@
+import os
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+import numpy_model
+import stream_data
+from preprocessing import load_preprocessor
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+calibration_bins = 10 # equal-width bins of the top predicted probability
+worker_state = dict() # models loaded in this process, by path
+
+## Scoring
+def get_model(model_path):
+    """Helper: the NumPy model and preprocessor saved at model_path, loaded once per process"""
+    if model_path not in worker_state:
+        worker_state[model_path] = (numpy_model.load_model(model_path), load_preprocessor(model_path))
+    return worker_state[model_path]
+
+def get_period(start_time, period):
+    """Helper: the month (YYYY-MM) or ISO week (YYYY-Www) of each at bat's start time"""
+    if period == 'month':
+        return start_time.astype(str).str.slice(0, 7).to_numpy()
+    return pd.to_datetime(start_time.astype(str).str.slice(0, 19)).dt.strftime("%G-W%V").to_numpy()
+
+def score_chunk(chunk, season, model_path, group_by, period=None, batch_size=8192):
+    """Score one chunk and reduce it to partial sums per grouping and calibration bin"""
+    model, preprocessor = get_model(model_path)
+    chunk = chunk.loc[chunk['raw_pitch_type'] != "other"].dropna(subset=preprocessor.plain_features)
+    labels = pd.Categorical(chunk['pitch_type'], categories=stream_data.pitch_types).codes
+    chunk, labels = chunk[labels >= 0], labels[labels >= 0]
+    X = preprocessor.transform(chunk)
+    probs = np.empty((len(X), len(stream_data.pitch_types)), dtype=np.float32)
+    for start in range(0, len(X), batch_size):
+        probs[start:start+batch_size] = model.predict(X[start:start+batch_size])
+    confidence = probs.max(axis=1)
+    stats = pd.DataFrame({
+        'season': season,
+        'rows': 1,
+        'log_loss': -np.log(np.clip(probs[np.arange(len(labels)), labels], 1e-7, 1)),
+        'correct': probs.argmax(axis=1) == labels,
+        'confidence': confidence,
+        'bin': np.minimum((confidence * calibration_bins).astype(np.int8), calibration_bins - 1),
+    })
+    for column in group_by:
+        stats[column] = chunk[column].to_numpy()
+    keys = ['season']
+    if period is not None:
+        stats['period'] = get_period(chunk['start_time'], period)
+        keys.append('period')
+    metrics = ['rows', 'log_loss', 'correct', 'confidence']
+    return {grouping: stats.groupby(keys + ([grouping] if grouping != 'all' else []) + ['bin'], observed=True)[metrics].sum() for grouping in ['all'] + list(group_by)}
+
+## Metrics
+def summarize(sums):
+    """Log loss, accuracy, mean confidence and expected calibration error per group, from summed partials"""
+    keys = [name for name in sums.index.names if name != 'bin']
+    totals = sums.groupby(level=keys).sum()
+    calibration_gap = (sums['correct'] - sums['confidence']).abs().groupby(level=keys).sum()
+    return pd.DataFrame({
+        'rows': totals['rows'],
+        'log_loss': totals['log_loss'] / totals['rows'],
+        'accuracy': totals['correct'] / totals['rows'],
+        'mean_confidence': totals['confidence'] / totals['rows'],
+        'ece': calibration_gap / totals['rows'],
+    })
+
+def get_reliability(sums):
+    """Accuracy against mean confidence in each calibration bin (the reliability diagram), over every row"""
+    totals = sums.groupby(level='bin').sum()
+    return pd.DataFrame({'rows': totals['rows'], 'mean_confidence': totals['confidence'] / totals['rows'], 'accuracy': totals['correct'] / totals['rows']})
+
+## Backtest
+def get_season_path(season):
+    """Helper: path of a season's store, parquet if it exists, else csv"""
+    for extension in ("parquet", "csv"):
+        season_path = os.path.join(root_dir, f"data/{season}.{extension}")
+        if os.path.exists(season_path):
+            return season_path
+    raise Exception(f"{season} dataframe not yet built. Build first with `python pipeline/main.py -s {season}`")
+
+def get_model_path(model_path, season):
+    """Helper: model path for a held-out season"""
+    return model_path.format(train_through=season - 1)
+
+def backtest(season_paths, model_path, group_by=('pitcher_id', 'count', 'inning'), period=None, chunk_size=100_000, processes=1):
+    """Stream each held-out season through its model; return metrics per grouping and the reliability table"""
+    group_by = list(group_by)
+    tasks = list()
+    for season, season_path in sorted(season_paths.items()):
+        season_model_path = get_model_path(model_path, season)
+        columns = load_preprocessor(season_model_path).input_columns + ['pitch_type', 'raw_pitch_type'] + group_by + (['start_time'] if period else [])
+        tasks.append((season, season_path, season_model_path, list(dict.fromkeys(columns))))
+
+    partials = list()
+    if processes > 1:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(processes, mp_context=context) as executor:
+            pending = set()
+            for season, season_path, season_model_path, columns in tasks:
+                for chunk in stream_data.iter_chunks(season_path, columns, chunk_size):
+                    if len(pending) >= 2 * processes:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        partials.extend(future.result() for future in finished)
+                    pending.add(executor.submit(score_chunk, chunk, season, season_model_path, group_by, period))
+            partials.extend(future.result() for future in pending)
+    else:
+        for season, season_path, season_model_path, columns in tasks:
+            partials.extend(score_chunk(chunk, season, season_model_path, group_by, period) for chunk in stream_data.iter_chunks(season_path, columns, chunk_size))
+
+    results = dict()
+    for grouping in ['all'] + group_by:
+        sums = pd.concat([partial[grouping] for partial in partials])
+        sums = sums.groupby(level=list(sums.index.names)).sum() # combine chunks' partial sums
+        results[grouping] = summarize(sums)
+        if grouping == 'all':
+            results['reliability'] = get_reliability(sums)
+    return results
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--first_season", type=int)
+    parser.add_argument("-l", "--last_season", type=int)
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5", help="may contain {train_through}, the season before each held-out season, for walk-forward backtests")
+    parser.add_argument("-g", "--group_by", nargs="+", default=['pitcher_id', 'count', 'inning'], help="season store columns to evaluate by")
+    parser.add_argument("--period", choices=['month', 'week'], default=None, help="also split each season into time-ordered periods")
+    parser.add_argument("-c", "--chunk_size", type=int, default=100_000)
+    parser.add_argument("-n", "--processes", type=int, default=1)
+    parser.add_argument("--min_rows", type=int, default=100, help="leave out groups with fewer rows")
+    parser.add_argument("-o", "--output_dir", type=str, default=None, help="default: model/backtests/<model name>")
+    args = parser.parse_args()
+
+    # Backtest
+    season_paths = {season: get_season_path(season) for season in range(args.first_season, args.last_season + 1)}
+    results = backtest(season_paths, args.model_path, args.group_by, args.period, args.chunk_size, args.processes)
+
+    # Write tables and report
+    model_name = os.path.splitext(os.path.basename(args.model_path))[0].replace("{train_through}", "walk_forward")
+    output_dir = args.output_dir or os.path.join(root_dir, "model/backtests", model_name)
+    os.makedirs(output_dir, exist_ok=True)
+    for name, table in results.items():
+        if name not in ('all', 'reliability'):
+            table = table[table['rows'] >= args.min_rows]
+        table.to_csv(os.path.join(output_dir, f"{name}.csv"))
+    print(results['all'].to_string(float_format="{:.4f}".format))
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(results['all'].reset_index().to_dict('records'), f, indent=2, default=str)
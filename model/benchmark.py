@@ -0,0 +1,71 @@
+import json
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+## Synthetic data
+def make_synthetic_data(n_rows, n_features=63, n_classes=9, seed=0):
+    """Synthetic standardized features and one-hot labels (63 features, as in the full model)"""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n_rows, n_features), dtype=np.float32)
+    logits = X @ rng.normal(scale=0.3, size=(n_features, n_classes)).astype(np.float32) + rng.gumbel(size=(n_rows, n_classes))
+    y = np.eye(n_classes, dtype=np.float32)[logits.argmax(axis=1)]
+    return X, y
+
+## Throughput
+def benchmark_threads(n_rows, n_features, batch_sizes, intra_op_threads, inter_op_threads, epochs, seed=0):
+    """Helper: time training at each batch size with the given TensorFlow threads"""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    import keras_tuner
+    from hypermodel import CustomHyperModel
+    from training_profile import TrainingProfiler
+    X, y = make_synthetic_data(n_rows, n_features, seed=seed)
+    results = list()
+    for batch_size in batch_sizes:
+        model = CustomHyperModel(n_features, y.shape[1]).build(keras_tuner.HyperParameters()) # default hyperparameters
+        profiler = TrainingProfiler()
+        model.fit(X, y, epochs=epochs, batch_size=batch_size, callbacks=[profiler.get_callback(n_rows)], verbose=0)
+        epoch_rates = [epoch['samples_per_second'] for epoch in profiler.trials[0]['epochs']]
+        results.append({
+            'batch_size': batch_size,
+            'intra_op_threads': intra_op_threads,
+            'inter_op_threads': inter_op_threads,
+            'samples_per_second': float(np.median(epoch_rates[1:] if len(epoch_rates) > 1 else epoch_rates)), # first epoch includes tracing
+            'final_loss': profiler.trials[0]['epochs'][-1]['loss'],
+        })
+    return results
+
+def run_sweep(n_rows, n_features, batch_sizes, intra_op_threads, inter_op_threads, epochs):
+    """Time every batch size under every thread setting, one process per setting"""
+    context = multiprocessing.get_context("spawn")
+    results = list()
+    for intra, inter in itertools.product(intra_op_threads, inter_op_threads):
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            results.extend(executor.submit(benchmark_threads, n_rows, n_features, batch_sizes, intra, inter, epochs).result())
+        for result in results[-len(batch_sizes):]:
+            print(f"batch {result['batch_size']:<6} intra {intra:<3} inter {inter:<3} {result['samples_per_second']:12,.0f} samples/s   loss {result['final_loss']:.4f}")
+    return results
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--rows", type=int, default=200_000, help="synthetic training rows")
+    parser.add_argument("-f", "--features", type=int, default=63)
+    parser.add_argument("-b", "--batch_sizes", type=int, nargs="+", default=[256, 1024, 4096])
+    parser.add_argument("-t", "--intra_op_threads", type=int, nargs="+", default=[0], help="0 lets TensorFlow choose")
+    parser.add_argument("-i", "--inter_op_threads", type=int, nargs="+", default=[0], help="0 lets TensorFlow choose")
+    parser.add_argument("-e", "--epochs", type=int, default=3)
+    parser.add_argument("-o", "--output", type=str, default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    # Sweep and report
+    results = run_sweep(args.rows, args.features, args.batch_sizes, args.intra_op_threads, args.inter_op_threads, args.epochs)
+    best = max(results, key=lambda result: result['samples_per_second'])
+    print(f"fastest: batch {best['batch_size']}, intra {best['intra_op_threads']}, inter {best['inter_op_threads']} ({best['samples_per_second']:,.0f} samples/s)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
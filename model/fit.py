@@ -1,6 +1,9 @@
 import argparse
 import os
 import json
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from tensorflow import keras
@@ -8,43 +11,78 @@ import keras_tuner
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from hypermodel import CustomHyperModel
+import numpy_model
+import stream_data
+import parallel_tuning
+from training_profile import TrainingProfiler
+from preprocessing import Preprocessor, get_preprocessing_path
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 ## Load data ##
-def load_data(seasons):
-    """Concat training data from provided training seasons"""
-    season_dfs = list()
-    for season in seasons:
-        season_path = os.path.join(root_dir, f"data/{season}.csv")
-        if not os.path.exists(season_path):
-            raise Exception(f"{season} dataframe not yet built. Build first with `python pipeline/main.py -s {season}`")
-        season_dfs.append(pd.read_csv(season_path))
+def load_data(seasons, columns=None, workers=4):
+    """Concat training data from provided training seasons, reading seasons in parallel"""
+    load = lambda season: load_season(season, columns)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        season_dfs = list(executor.map(load, seasons))
     df = pd.concat(season_dfs).reset_index(drop=True)
     return df
+
+def load_season(season, columns=None):
+    """Helper: load one season's dataframe (only `columns`, if given) from parquet, falling back on csv"""
+    season_path = get_season_path(season)
+    if season_path.endswith(".parquet"):
+        return pd.read_parquet(season_path, columns=columns)
+    return pd.read_csv(season_path, usecols=columns)
+
+def get_season_path(season):
+    """Helper: path of a season's store, parquet if it exists, else csv"""
+    parquet_path = os.path.join(root_dir, f"data/{season}.parquet")
+    csv_path = os.path.join(root_dir, f"data/{season}.csv")
+    if os.path.exists(parquet_path):
+        return parquet_path
+    if os.path.exists(csv_path):
+        return csv_path
+    raise Exception(f"{season} dataframe not yet built. Build first with `python pipeline/main.py -s {season}`")
+
+def get_load_columns(simple=False):
+    """Collect the columns training needs from the season store"""
+    plain_features = get_features([], simple=simple)
+    dummy_columns, _ = get_dummy_columns_and_prefixes(simple)
+    return plain_features + dummy_columns + ['pitch_type', 'raw_pitch_type']
+
+def get_season_stream(seasons, simple=False, chunk_size=100_000, scaler_path=None):
+    """Stream training seasons chunk by chunk (for data that doesn't fit in memory), scaling as scale_and_split does"""
+    dummy_columns, _ = get_dummy_columns_and_prefixes(simple)
+    season_paths = [get_season_path(season) for season in seasons]
+    features = get_features(stream_data.get_dummy_names(dummy_columns), simple=simple)
+    return stream_data.SeasonStream(season_paths, features, dummy_columns, chunk_size=chunk_size, scale=not simple, scaler_path=scaler_path)
  
 ## Prep data for modeling ##
 def create_train_and_test_data(df, simple=False):
-    """Create train/test data"""
+    """Create train/test data, and the preprocessing that turns season store columns into the model's inputs"""
     df, dummy_columns = get_dummies(df, simple=simple)
     features = get_features(dummy_columns, simple=simple)
     X = df.loc[df['raw_pitch_type'] != "other"].dropna(subset=features)[features]
     y = df.loc[df['raw_pitch_type'] != "other"].dropna(subset=features)['pitch_type']
     y = pd.get_dummies(y)
     y = y[['fastball', 'curveball', 'sinker', 'cutter', 'changeup', 'slider', 'splitter', 'knuckle_curve', 'other']] # reorder
-    X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy = scale_and_split(X, y, simple)
-    return X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy
+    X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy, ss = scale_and_split(X, y, simple)
+    columns_and_prefixes = zip(*get_dummy_columns_and_prefixes(simple))
+    preprocessor = Preprocessor.from_dummy_names(features, dummy_columns, columns_and_prefixes, ss.mean_ if ss else None, ss.scale_ if ss else None)
+    return X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy, preprocessor
 
 def get_dummies(df, simple=False):
     """Create dummies for dataframe"""
-    if simple:
-        dummy_columns = ['count']
-        prefixes = ['count']
-    else:
-        dummy_columns = ['pitch_type_lag_1', 'pitch_type_lag_2']
-        prefixes = ['count', 'lag_1', 'lag_2']
+    dummy_columns, prefixes = get_dummy_columns_and_prefixes(simple)
     dummy_df = pd.get_dummies(df[dummy_columns], prefix=prefixes)
     return df.join(dummy_df), dummy_df.columns
 
+def get_dummy_columns_and_prefixes(simple=False):
+    """Helper: columns to one-hot encode, and their dummy prefixes"""
+    if simple:
+        return ['count'], ['count']
+    return ['count', 'pitch_type_lag_1', 'pitch_type_lag_2'], ['count', 'lag_1', 'lag_2']
+
 def get_features(dummy_columns, simple=False):
     """Collect features for training"""
     # Plain/direct features
@@ -72,25 +110,70 @@ def get_features(dummy_columns, simple=False):
     return features 
  
 def scale_and_split(X, y, simple=False):
-    """Split train/test and scale off of train"""
+    """Split train/test and scale off of train (returning the fit scaler, or None if unscaled)"""
     X_train, X_val, y_train, y_val = train_test_split(X, y)
-    X_train_numpy = X_train.astype(float).to_numpy()
-    y_train_numpy = y_train.astype(float).to_numpy()
-    X_val_numpy = X_val.astype(float).to_numpy()
-    y_val_numpy = y_val.astype(float).to_numpy()
+    X_train_numpy = X_train.to_numpy(dtype=np.float32)
+    y_train_numpy = y_train.to_numpy(dtype=np.float32)
+    X_val_numpy = X_val.to_numpy(dtype=np.float32)
+    y_val_numpy = y_val.to_numpy(dtype=np.float32)
+    ss = None
     if not simple: # simple model has no scaling so input can be used directly
         ss = StandardScaler()
         X_train_numpy = ss.fit_transform(X_train_numpy)
         X_val_numpy = ss.transform(X_val_numpy)
-    return X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy
+    return X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy, ss
 
 ## Tune and return model ##
-def tune_model(X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy):
+def tune_model(X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy, callbacks=()):
     """Tune model with keras_tuner and return best model"""
-    input_shape = X_train_numpy.shape[1]
-    output_shape = y_train_numpy.shape[1]
+    tuner, config = get_tuner(X_train_numpy.shape[1], y_train_numpy.shape[1])
+    tuner.search(
+        X_train_numpy,
+        y_train_numpy,
+        validation_data=(X_val_numpy, y_val_numpy),
+        epochs=config['epochs'],
+        batch_size=config['batch_size'],
+        callbacks=[keras.callbacks.EarlyStopping(patience=config['patience']), *callbacks]
+    )
+    model = tuner.get_best_models()[0]
+    return model
+
+def tune_model_on_stream(season_stream, callbacks=()):
+    """Tune model with keras_tuner on a season stream's tf.data pipelines and return best model"""
+    tuner, config = get_tuner(len(season_stream.features), len(stream_data.pitch_types))
+    tuner.search(
+        season_stream.get_dataset("train", config['batch_size']),
+        validation_data=season_stream.get_dataset("val", config['batch_size']),
+        epochs=config['epochs'],
+        callbacks=[keras.callbacks.EarlyStopping(patience=config['patience']), *callbacks]
+    )
+    model = tuner.get_best_models()[0]
+    return model
+
+def tune_model_parallel(X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy, workers, threads_per_worker=1, scheduler="random"):
+    """Tune model with trials run in parallel processes and return best model and timing report"""
+    config = load_config()
+    model, report = parallel_tuning.tune_parallel(
+        X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy,
+        workers=workers,
+        threads_per_worker=threads_per_worker,
+        scheduler=scheduler,
+        max_trials=50,
+        epochs=config['epochs'],
+        batch_size=config['batch_size'],
+        patience=config['patience'],
+    )
+    return model, report
+
+def load_config():
+    """Helper: read the training config"""
     with open(os.path.join(root_dir, "model/config.json"), "r") as f:
         config = json.load(f)
+    return config
+
+def get_tuner(input_shape, output_shape):
+    """Helper: build the tuner and read the training config"""
+    config = load_config()
     tuner = keras_tuner.RandomSearch(
         hypermodel=CustomHyperModel(input_shape, output_shape),
         objective='val_loss',
@@ -100,16 +183,7 @@ def tune_model(X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy):
         project_name='keras_tuner',
         overwrite=True,
     )
-    tuner.search(
-        X_train_numpy,
-        y_train_numpy,
-        validation_data=(X_val_numpy, y_val_numpy),
-        epochs=config['epochs'],
-        batch_size=config['batch_size'],
-        callbacks=[keras.callbacks.EarlyStopping(patience=config['patience'])]
-    )
-    model = tuner.get_best_models()[0]
-    return model
+    return tuner, config
 
 if __name__ == "__main__":    
     # Get arguments
@@ -118,7 +192,15 @@ if __name__ == "__main__":
     parser.add_argument("-l", "--last_training_season", type=int)
     parser.add_argument("-n", "--model_name", type=str, default="fit_model")
     parser.add_argument('-s', '--simple', action='store_true', help="build simple model (for streamlit app)")
+    parser.add_argument('--stream', action='store_true', help="stream seasons in chunks instead of loading them into memory")
+    parser.add_argument('--chunk_size', type=int, default=100_000, help="rows per chunk when streaming")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="tune with trials in this many parallel processes")
+    parser.add_argument('--threads_per_worker', type=int, default=1, help="TensorFlow threads per tuning process")
+    parser.add_argument('--scheduler', choices=['random', 'hyperband'], default='random', help="parallel tuning: random search, or hyperband to stop poor trials early")
+    parser.add_argument('-p', '--profile', action='store_true', help="write stage times, peak memory and training throughput to model/profiles")
     args = parser.parse_args()
+    if args.stream and (args.workers > 1 or args.scheduler != 'random'):
+        parser.error("parallel tuning needs the data in memory, so can't be used with --stream")
     first_training_season = args.first_training_season
     last_training_season = args.last_training_season
     model_name = args.model_name
@@ -129,15 +211,42 @@ if __name__ == "__main__":
     if not os.path.exists(saved_models_dir):
         os.mkdir(saved_models_dir)
     
-    # Load data
-    training_seasons = np.arange(first_training_season, last_training_season+1)
-    df = load_data(training_seasons)
- 
-    # Clean/transform/train test split
-    X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy = create_train_and_test_data(df, simple=simple_model)
+    profiler = TrainingProfiler() if args.profile else None
+    stage = profiler.stage if profiler else lambda name: nullcontext()
     
-    # Tune
-    model = tune_model(X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy)
+    training_seasons = np.arange(first_training_season, last_training_season+1)
+    if args.stream:
+        # Stream, scale and tune
+        with stage("scale"):
+            season_stream = get_season_stream(training_seasons, simple=simple_model, chunk_size=args.chunk_size)
+            preprocessor = season_stream.get_preprocessor()
+        with stage("tune"):
+            model = tune_model_on_stream(season_stream, callbacks=[profiler.get_callback(lambda: season_stream.rows_read['train'])] if profiler else ())
+    else:
+        # Load data
+        with stage("load"):
+            df = load_data(training_seasons, columns=get_load_columns(simple=simple_model))
+     
+        # Clean/transform/train test split
+        with stage("preprocess"):
+            X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy, preprocessor = create_train_and_test_data(df, simple=simple_model)
+        
+        # Tune
+        with stage("tune"):
+            if args.workers > 1 or args.scheduler != 'random':
+                model, tuning_report = tune_model_parallel(X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy, args.workers, args.threads_per_worker, args.scheduler)
+                print(f"Best val_loss {tuning_report['best_val_loss']:.4f} after {tuning_report['seconds_to_best']:.0f}s ({tuning_report['total_seconds']:.0f}s total)")
+                with open(os.path.join(saved_models_dir, f"{model_name}_tuning.json"), "w") as f:
+                    json.dump(tuning_report, f, indent=2, default=float)
+                if profiler:
+                    profiler.trials.extend(tuning_report['trials'])
+            else:
+                model = tune_model(X_train_numpy, X_val_numpy, y_train_numpy, y_val_numpy, callbacks=[profiler.get_callback(len(X_train_numpy))] if profiler else ())
 
     # Write out
-    model.save(os.path.join(saved_models_dir, f"{model_name}.h5"))
+    with stage("save"):
+        model.save(os.path.join(saved_models_dir, f"{model_name}.h5"))
+        preprocessor.save(get_preprocessing_path(os.path.join(saved_models_dir, f"{model_name}.h5"))) # feature order, vocabularies and scaling, for serving
+        numpy_model.export_weights(os.path.join(saved_models_dir, f"{model_name}.h5"), os.path.join(saved_models_dir, f"{model_name}.npz")) # for serving without TensorFlow
+    if profiler:
+        profiler.write(os.path.join(root_dir, "model/profiles", f"{model_name}_{time.strftime('%Y%m%d_%H%M%S')}.json"))
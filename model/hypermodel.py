@@ -34,4 +34,21 @@ class CustomHyperModel(keras_tuner.HyperModel):
         lr = hp.Choice("lr", [5e-4, 1e-3])
         optimizer = keras.optimizers.Adam(learning_rate=lr)
         model.compile(optimizer=optimizer, loss='categorical_crossentropy')
-        return model
\ No newline at end of file
+        return model
+class BestWeights(keras.callbacks.Callback):
+    """Restore the weights with the lowest val_loss when training ends"""
+    def __init__(self, baseline=None):
+        super().__init__()
+        self.baseline = baseline
+
+    def on_train_begin(self, logs=None):
+        self.best = self.baseline if self.baseline is not None else float('inf')
+        self.best_weights = self.model.get_weights() if self.baseline is not None else None
+
+    def on_epoch_end(self, epoch, logs=None):
+        if logs['val_loss'] < self.best:
+            self.best, self.best_weights = logs['val_loss'], self.model.get_weights()
+
+    def on_train_end(self, logs=None):
+        if self.best_weights is not None:
+            self.model.set_weights(self.best_weights)
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+from tensorflow import keras
+import numpy_model
+import stream_data
+from preprocessing import load_preprocessor, get_preprocessing_path
+from hypermodel import BestWeights
+from fit import get_season_path, get_load_columns, create_train_and_test_data, tune_model, load_config
+
+## Training state
+def get_state_path(model_path):
+    """Path of the json beside a model recording which games are new to it and its incremental updates"""
+    return os.path.splitext(model_path)[0] + "_training.json"
+
+def load_state(model_path):
+    """Helper: the model's training state, or an empty one"""
+    state_path = get_state_path(model_path)
+    if not os.path.exists(state_path):
+        return {'new_games_since': None, 'full_retrain_seconds': None, 'updates': list()}
+    with open(state_path, "r") as f:
+        return json.load(f)
+
+## Data
+def is_simple(preprocessor):
+    """Helper: whether the preprocessor is the simple model's (count is its only dummy column)"""
+    return list(preprocessor.dummies) == ['count']
+
+def get_new_game_ids(season_paths, since, chunk_size=100_000):
+    """Games whose first pitch is at or after since"""
+    game_starts = list()
+    for season_path in season_paths:
+        for chunk in stream_data.iter_chunks(season_path, ['game_id', 'start_time'], chunk_size):
+            game_starts.append(chunk.astype({'start_time': str}).groupby('game_id')['start_time'].min())
+    game_starts = pd.concat(game_starts).groupby(level=0).min()
+    return set(game_starts.index[game_starts >= since])
+
+def load_pitches(season_paths, preprocessor, since, replay=0, chunk_size=100_000, seed=0):
+    """New games' pitches, plus a uniform sample of replay times as many earlier pitches"""
+    new_game_ids = get_new_game_ids(season_paths, since, chunk_size)
+    columns = list(dict.fromkeys(get_load_columns(is_simple(preprocessor)) + preprocessor.input_columns + ['game_id', 'start_time']))
+
+    def iter_filtered():
+        """Helper: each chunk's rows fit would keep, and which are from new games"""
+        for season_path in season_paths:
+            for chunk in stream_data.iter_chunks(season_path, columns, chunk_size):
+                chunk = chunk.loc[chunk['raw_pitch_type'] != "other"].dropna(subset=preprocessor.plain_features)
+                yield chunk, chunk['game_id'].isin(new_game_ids).to_numpy()
+
+    new_df = pd.concat([chunk[is_new] for chunk, is_new in iter_filtered()], ignore_index=True)
+    n_replay = int(replay * len(new_df))
+    if not n_replay:
+        return new_df, new_df.iloc[:0]
+    rng = np.random.default_rng(seed)
+    old_df = None
+    for chunk, is_new in iter_filtered():
+        old_chunk = chunk[~is_new].assign(replay_key=rng.random((~is_new).sum()))
+        old_df = pd.concat([old_df, old_chunk]).nsmallest(n_replay, 'replay_key')
+    return new_df, old_df.drop(columns='replay_key').reset_index(drop=True)
+
+def split_by_game(new_df, val_fraction=0.2, holdout_fraction=0.2):
+    """Split the new games by first pitch into training, validation and holdout rows"""
+    game_starts = new_df.astype({'start_time': str}).groupby('game_id')['start_time'].min().sort_values(kind='stable')
+    n_holdout = max(1, int(len(game_starts) * holdout_fraction))
+    n_val = max(1, int(len(game_starts) * val_fraction))
+    is_holdout = new_df['game_id'].isin(game_starts.index[-n_holdout:]).to_numpy()
+    is_val = new_df['game_id'].isin(game_starts.index[-n_holdout-n_val:-n_holdout]).to_numpy()
+    return new_df[~is_val & ~is_holdout], new_df[is_val], new_df[is_holdout], game_starts.iloc[-n_holdout-n_val], game_starts.iloc[-n_holdout]
+
+def encode(df, preprocessor):
+    """Helper: model inputs and one-hot targets for already filtered store rows"""
+    return stream_data.encode_chunk(df, preprocessor)
+
+def get_log_loss(probs, y):
+    """Mean categorical cross-entropy, clipped as Keras clips it"""
+    return float(-np.log(np.clip((probs * y).sum(axis=1), 1e-7, 1)).mean())
+
+## Fine-tune
+def fine_tune(model, X_train, y_train, X_val, y_val, epochs=5, batch_size=1024, patience=2, learning_rate=None):
+    """Continue training a saved model, keeping its best weights on the validation games"""
+    if learning_rate is not None:
+        model.optimizer.learning_rate.assign(learning_rate)
+    baseline = model.evaluate(X_val, y_val, batch_size=8192, verbose=0, return_dict=True)['loss']
+    callbacks = [BestWeights(baseline), keras.callbacks.EarlyStopping(patience=patience)]
+    history = model.fit(X_train, y_train, validation_data=(X_val, y_val), epochs=epochs, batch_size=batch_size, callbacks=callbacks, verbose=0)
+    return len(history.history['val_loss'])
+
+def full_retrain(season_paths, held_out_df, simple):
+    """Retrain from scratch as fit.py does, without the holdout games"""
+    start = time.perf_counter()
+    columns = get_load_columns(simple) + ['game_id']
+    df = pd.concat([pd.read_parquet(path, columns=columns) if path.endswith(".parquet") else pd.read_csv(path, usecols=columns) for path in season_paths], ignore_index=True)
+    df = df.loc[~df['game_id'].isin(held_out_df['game_id'].unique())].drop(columns='game_id')
+    X_train, X_val, y_train, y_val, preprocessor = create_train_and_test_data(df, simple=simple)
+    model = tune_model(X_train, X_val, y_train, y_val)
+    return model, preprocessor, time.perf_counter() - start
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--first_season", type=int)
+    parser.add_argument("-l", "--last_season", type=int)
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    parser.add_argument("-s", "--since", type=str, default=None, help="train on games starting at or after this time, e.g. 2022-06-01 (default: the games after the model's last update)")
+    parser.add_argument("-r", "--replay", type=float, default=0, help="mix in this many older pitches per new pitch, sampled across the seasons")
+    parser.add_argument("-e", "--epochs", type=int, default=5)
+    parser.add_argument("--learning_rate", type=float, default=None, help="default: the saved optimizer's")
+    parser.add_argument("--val_fraction", type=float, default=0.2, help="fraction of the new games held out for early stopping (the latest before the holdout games)")
+    parser.add_argument("--holdout_fraction", type=float, default=0.2, help="fraction of the new games (the latest) held out to report the update's loss on")
+    parser.add_argument("-c", "--chunk_size", type=int, default=100_000)
+    parser.add_argument("--compare_full", action='store_true', help="also retrain from scratch as fit.py does, to compare time and validation loss")
+    parser.add_argument("-o", "--output_path", type=str, default=None, help="where to save the updated model (default: <model>_updated.h5 beside it; give model_path itself to update in place)")
+    args = parser.parse_args()
+    state = load_state(args.model_path)
+    since = args.since or state['new_games_since']
+    if since is None:
+        parser.error(f"no training state at {get_state_path(args.model_path)}, so give --since")
+
+    # Load the saved model, its preprocessing and the new pitches
+    start = time.perf_counter()
+    model = keras.models.load_model(args.model_path)
+    preprocessor = load_preprocessor(args.model_path)
+    season_paths = [get_season_path(season) for season in range(args.first_season, args.last_season + 1)]
+    new_df, old_df = load_pitches(season_paths, preprocessor, since, args.replay, args.chunk_size)
+    if new_df['game_id'].nunique() < 3:
+        raise Exception(f"Need at least three new games since {since} (to train on, validate and hold out); append them with `python pipeline/main.py -s <season> -a`")
+    train_df, val_df, holdout_df, val_since, holdout_since = split_by_game(new_df, args.val_fraction, args.holdout_fraction)
+    X_train, y_train = encode(pd.concat([train_df, old_df], ignore_index=True), preprocessor)
+    X_val, y_val = encode(val_df, preprocessor)
+    X_holdout, y_holdout = encode(holdout_df, preprocessor)
+
+    # Fine-tune
+    config = load_config()
+    loss_before = get_log_loss(model.predict(X_holdout, batch_size=8192, verbose=0), y_holdout)
+    epochs_run = fine_tune(model, X_train, y_train, X_val, y_val, args.epochs, config['batch_size'], min(config['patience'], args.epochs), args.learning_rate)
+    loss_after = get_log_loss(model.predict(X_holdout, batch_size=8192, verbose=0), y_holdout)
+    seconds = time.perf_counter() - start
+    report = {
+        'since': since,
+        'val_games_since': val_since,
+        'holdout_games_since': holdout_since,
+        'new_pitches': len(train_df),
+        'replay_pitches': len(old_df),
+        'val_pitches': len(val_df),
+        'holdout_pitches': len(holdout_df),
+        'epochs_run': epochs_run,
+        'seconds': seconds,
+        'holdout_loss_before': loss_before,
+        'holdout_loss_after': loss_after,
+    }
+
+    # Compare with a full retrain
+    if args.compare_full:
+        full_model, full_preprocessor, state['full_retrain_seconds'] = full_retrain(season_paths, pd.concat([val_df, holdout_df]), is_simple(preprocessor))
+        X_holdout_full, y_holdout_full = encode(holdout_df, full_preprocessor)
+        report['full_holdout_loss'] = get_log_loss(full_model.predict(X_holdout_full, batch_size=8192, verbose=0), y_holdout_full)
+        report['holdout_loss_delta'] = loss_after - report['full_holdout_loss'] # positive: the full retrain does better
+    if state['full_retrain_seconds'] is not None:
+        report['full_retrain_seconds'] = state['full_retrain_seconds']
+        report['seconds_saved'] = state['full_retrain_seconds'] - seconds
+    print(json.dumps(report, indent=2))
+
+    # Save the updated model (its preprocessing is unchanged) and training state
+    output_path = args.output_path or os.path.splitext(args.model_path)[0] + "_updated.h5" # never the shipped model unless asked
+    model.save(output_path)
+    numpy_model.export_weights(output_path, os.path.splitext(output_path)[0] + ".npz")
+    if output_path != args.model_path:
+        shutil.copyfile(get_preprocessing_path(args.model_path), get_preprocessing_path(output_path))
+    state['new_games_since'] = val_since # validation and holdout games are trained on in the next update
+    state['updates'].append(report)
+    with open(get_state_path(output_path), "w") as f:
+        json.dump(state, f, indent=2, default=float)
@@ -0,0 +1,15 @@
+import os
+import resource
+
+## Process memory
+def get_rss_mb():
+    """Current resident memory of this process (the high-water mark where /proc isn't available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return get_max_rss_mb()
+
+def get_max_rss_mb():
+    """Resident memory high-water mark of this process"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
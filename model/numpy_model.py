@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+activations = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+    'softmax': lambda x: softmax(x),
+}
+
+def softmax(x):
+    """Helper: row-wise softmax"""
+    x = x - x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+## Export
+def export_weights(h5_path, npz_path):
+    """Export a saved Sequential model's weights from .h5 to .npz, without TensorFlow"""
+    import h5py
+    with h5py.File(h5_path, "r") as f:
+        model_config = json.loads(f.attrs['model_config'])
+        weights = f['model_weights']
+        arrays, ops = dict(), list()
+        for layer in model_config['config']['layers']:
+            layer_class, layer_config = layer['class_name'], layer['config']
+            if layer_class == 'Dense':
+                group = weights[layer_config['name']]
+                kernel_name, bias_name = [name.decode() if isinstance(name, bytes) else name for name in group.attrs['weight_names']]
+                kernel, bias = np.array(group[kernel_name], dtype=np.float32), np.array(group[bias_name], dtype=np.float32)
+                i = len([op for op in ops if op.startswith("dense")])
+                arrays[f"kernel_{i}"] = kernel
+                arrays[f"bias_{i}"] = bias
+                ops.append(f"dense:{i}")
+                if layer_config.get('activation', 'linear') != 'linear':
+                    ops.append(f"activation:{layer_config['activation']}")
+            elif layer_class == 'Activation':
+                ops.append(f"activation:{layer_config['activation']}")
+            elif layer_class in ('Dropout', 'InputLayer'):
+                continue # no-ops at inference
+            else:
+                raise ValueError(f"Can't export {layer_class} layers")
+    np.savez(npz_path, ops=np.array(ops), **arrays)
+
+## Inference
+class NumpyModel:
+    """Forward pass of an exported model in NumPy, with the same predict() as the Keras model"""
+    def __init__(self, npz_path):
+        with np.load(npz_path) as arrays:
+            self.ops = list(arrays['ops'])
+            self.layers = dict()
+            for op in self.ops:
+                kind, arg = op.split(":")
+                if kind == 'dense':
+                    self.layers[arg] = (arrays[f"kernel_{arg}"], arrays[f"bias_{arg}"])
+                elif arg not in activations:
+                    raise ValueError(f"Unknown activation {arg}")
+
+    def predict(self, X, batch_size=None, verbose=0):
+        """Class probabilities for each row of X (batch_size and verbose are accepted for Keras compatibility)"""
+        x = np.asarray(X, dtype=np.float32)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        for op in self.ops:
+            kind, arg = op.split(":")
+            if kind == 'dense':
+                kernel, bias = self.layers[arg]
+                x = x @ kernel
+                x += bias
+            else:
+                x = activations[arg](x)
+        return x
+
+    __call__ = predict
+
+def load_model(model_path):
+    """Load a NumPy model, re-exporting it if the .npz is missing or older than the .h5"""
+    h5_path, npz_path = os.path.splitext(model_path)[0] + ".h5", os.path.splitext(model_path)[0] + ".npz"
+    if not os.path.exists(npz_path) or (os.path.exists(h5_path) and os.path.getmtime(npz_path) < os.path.getmtime(h5_path)):
+        temp_path = f"{os.path.splitext(npz_path)[0]}.{os.getpid()}.tmp.npz" # processes loading at once each write their own
+        export_weights(h5_path, temp_path)
+        os.replace(temp_path, npz_path)
+    return NumpyModel(npz_path)
+
+## Parity and latency against Keras
+def compare_to_keras(h5_path, npz_path, n_rows=10_000, repeat=50, seed=0, tolerance=1e-4):
+    """Check NumPy and Keras predictions agree on random inputs and time both"""
+    from tensorflow import keras
+    keras_model = keras.models.load_model(h5_path)
+    numpy_model = NumpyModel(npz_path)
+    n_features = keras_model.input_shape[1]
+    X = np.random.default_rng(seed).normal(size=(n_rows, n_features)).astype(np.float32)
+    keras_probs, numpy_probs = keras_model.predict(X, batch_size=4096, verbose=0), numpy_model.predict(X)
+    max_diff = np.abs(keras_probs - numpy_probs).max()
+    top_class_diff = (keras_probs.argmax(axis=1) != numpy_probs.argmax(axis=1)).mean()
+    print(f"max abs difference over {n_rows} rows: {max_diff:.2e}, top class differs on {top_class_diff:.2%}")
+    if max_diff > tolerance:
+        raise AssertionError(f"NumPy predictions differ from Keras beyond tolerance {tolerance:g}")
+    for batch_rows in (1, 64, 4096):
+        for name, predict in (('keras predict', lambda x: keras_model.predict(x, verbose=0)), ('keras __call__', lambda x: keras_model(x, training=False).numpy()), ('numpy', numpy_model.predict)):
+            predict(X[:batch_rows])
+            start = time.perf_counter()
+            for _ in range(repeat):
+                predict(X[:batch_rows])
+            print(f"batch {batch_rows:<5} {name:<15} {1000*(time.perf_counter() - start)/repeat:8.3f}ms")
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    parser.add_argument("-c", "--compare", action='store_true', help="check parity and latency against Keras")
+    args = parser.parse_args()
+
+    # Export (and compare)
+    npz_path = os.path.splitext(args.model_path)[0] + ".npz"
+    export_weights(args.model_path, npz_path)
+    if args.compare:
+        compare_to_keras(args.model_path, npz_path)
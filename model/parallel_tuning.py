@@ -0,0 +1,124 @@
+import os
+import math
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+worker_state = dict() # set in each worker process by init_worker
+
+## Search space
+def get_search_space(input_shape, output_shape):
+    """CustomHyperModel's hyperparameters, registered at their defaults"""
+    import keras_tuner
+    from hypermodel import CustomHyperModel
+    hp = keras_tuner.HyperParameters()
+    CustomHyperModel(input_shape, output_shape).build(hp)
+    return hp
+
+def sample_trials(hp, n_trials, seed=0):
+    """Random hyperparameter values for n_trials trials"""
+    rng = np.random.default_rng(seed)
+    return [{param.name: param.random_sample(int(rng.integers(2**31))) for param in hp.space} for _ in range(n_trials)]
+
+def build_model(input_shape, output_shape, values):
+    """Helper: CustomHyperModel built with the given hyperparameter values"""
+    from hypermodel import CustomHyperModel
+    hypermodel = CustomHyperModel(input_shape, output_shape)
+    hp = get_search_space(input_shape, output_shape)
+    hp.values.update(values)
+    return hypermodel.build(hp)
+
+## Workers
+def init_worker(data_dir, threads_per_worker):
+    """Cap TensorFlow's threads (so workers don't oversubscribe the cores) and map the training arrays"""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    for name in ('X_train', 'X_val', 'y_train', 'y_val'):
+        worker_state[name] = np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode='r')
+
+def run_trial(values, epochs, batch_size, patience, initial_epoch=0, weights=None, val_loss=None):
+    """Train one trial up to epochs, returning its best val_loss and weights"""
+    from tensorflow import keras
+    from hypermodel import BestWeights
+    X_train, X_val, y_train, y_val = (worker_state[name] for name in ('X_train', 'X_val', 'y_train', 'y_val'))
+    model = build_model(X_train.shape[1], y_train.shape[1], values)
+    if weights is not None:
+        model.set_weights(weights)
+    start = time.perf_counter()
+    best_weights = BestWeights(baseline=val_loss if weights is not None else None)
+    early_stopping = keras.callbacks.EarlyStopping(patience=patience)
+    history = model.fit(X_train, y_train, validation_data=(X_val, y_val), epochs=epochs, initial_epoch=initial_epoch, batch_size=batch_size, callbacks=[best_weights, early_stopping], verbose=0)
+    return {'val_loss': best_weights.best, 'epochs_run': len(history.history['val_loss']), 'seconds': time.perf_counter() - start, 'weights': model.get_weights()}
+
+## Schedulers
+class TuningRun:
+    """Trials run across worker processes, tracking the best val_loss and when it was reached"""
+    def __init__(self, executor, batch_size, patience):
+        self.executor = executor
+        self.batch_size = batch_size
+        self.patience = patience
+        self.start = time.perf_counter()
+        self.best = None # result of the best trial so far
+        self.trials = list()
+
+    def run(self, trials, epochs, initial_epoch=0):
+        """Run trials to epochs in parallel, returning their results in order"""
+        futures = {self.executor.submit(run_trial, trial['values'], epochs, self.batch_size, self.patience, initial_epoch, trial.get('weights'), trial.get('val_loss')): i for i, trial in enumerate(trials)}
+        results = [None] * len(trials)
+        for future in as_completed(futures):
+            i = futures[future]
+            result = dict(future.result(), values=trials[i]['values'], epochs=epochs)
+            results[i] = result
+            self.trials.append({key: value for key, value in result.items() if key != 'weights'})
+            if self.best is None or result['val_loss'] < self.best['val_loss']:
+                self.best = dict(result, seconds_to_best=time.perf_counter() - self.start)
+        return results
+
+    def report(self):
+        """Best trial and wall-clock times, without weights"""
+        return {
+            'best_val_loss': self.best['val_loss'],
+            'best_values': self.best['values'],
+            'seconds_to_best': self.best['seconds_to_best'],
+            'total_seconds': time.perf_counter() - self.start,
+            'trials': self.trials,
+        }
+
+def random_search(tuning_run, hp, max_trials, epochs, seed=0):
+    """Every trial trained to epochs (with early stopping), as keras_tuner.RandomSearch does"""
+    tuning_run.run([{'values': values} for values in sample_trials(hp, max_trials, seed)], epochs)
+
+def hyperband(tuning_run, hp, max_epochs, eta=3, seed=0):
+    """Hyperband: successive halving brackets, keeping the best 1/eta of trials"""
+    s_max = int(math.log(max_epochs) / math.log(eta) + 1e-9)
+    for bracket, s in enumerate(range(s_max, -1, -1)):
+        n_trials = math.ceil((s_max + 1) / (s + 1) * eta ** s)
+        trials = [{'values': values} for values in sample_trials(hp, n_trials, seed=seed + bracket)]
+        epochs = 0
+        for rung in range(s + 1):
+            next_epochs = max(1, round(max_epochs * eta ** (rung - s)))
+            results = tuning_run.run(trials, next_epochs, initial_epoch=epochs)
+            epochs = next_epochs
+            n_keep = max(1, len(trials) // eta)
+            survivors = sorted(range(len(trials)), key=lambda i: results[i]['val_loss'])[:n_keep]
+            trials = [{'values': results[i]['values'], 'weights': results[i]['weights'], 'val_loss': results[i]['val_loss']} for i in survivors] # resume from each survivor's best weights
+
+def tune_parallel(X_train, X_val, y_train, y_val, workers, threads_per_worker=1, scheduler="random", max_trials=50, epochs=50, batch_size=1024, patience=3, eta=3, seed=0):
+    """Tune CustomHyperModel with trials spread over worker processes, returning the best model and a timing report"""
+    hp = get_search_space(X_train.shape[1], y_train.shape[1])
+    with tempfile.TemporaryDirectory() as data_dir:
+        for name, array in (('X_train', X_train), ('X_val', X_val), ('y_train', y_train), ('y_val', y_val)):
+            np.save(os.path.join(data_dir, f"{name}.npy"), np.asarray(array, dtype=np.float32)) # workers memory-map these instead of each getting a pickled copy
+        context = multiprocessing.get_context("spawn") # TensorFlow isn't fork-safe
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(data_dir, threads_per_worker)) as executor:
+            tuning_run = TuningRun(executor, batch_size, patience)
+            if scheduler == "hyperband":
+                hyperband(tuning_run, hp, epochs, eta, seed)
+            else:
+                random_search(tuning_run, hp, max_trials, epochs, seed)
+    model = build_model(X_train.shape[1], y_train.shape[1], tuning_run.best['values'])
+    model.set_weights(tuning_run.best['weights'])
+    return model, tuning_run.report()
@@ -0,0 +1,92 @@
+import os
+import json
+import argparse
+import numpy as np
+
+preprocessing_version = 1 # bump when the artifact's layout changes
+
+## Artifact
+class Preprocessor:
+    """Model inputs from season store columns: feature order, dummy levels and scaling"""
+    def __init__(self, features, dummies, mean=None, scale=None):
+        self.features = list(features)
+        self.dummies = {column: (prefix, list(levels)) for column, (prefix, levels) in dummies.items()}
+        self.mean = np.asarray(mean, dtype=np.float32) if mean is not None else None
+        self.scale = np.asarray(scale, dtype=np.float32) if scale is not None else None
+
+        # Compile column positions once, so transform is pure array work
+        positions = {feature: i for i, feature in enumerate(self.features)}
+        dummy_names = {f"{prefix}_{level}" for prefix, levels in self.dummies.values() for level in levels}
+        self.plain_features = [feature for feature in self.features if feature not in dummy_names]
+        self.plain_positions = np.array([positions[feature] for feature in self.plain_features], dtype=np.intp)
+        self.level_positions = {column: {level: positions[f"{prefix}_{level}"] for level in levels if f"{prefix}_{level}" in positions} for column, (prefix, levels) in self.dummies.items()}
+        self.input_columns = self.plain_features + list(self.dummies)
+
+    @classmethod
+    def from_dummy_names(cls, features, dummy_names, columns_and_prefixes, mean=None, scale=None):
+        """Build from the dummy feature names get_dummies produced, recovering each column's observed levels"""
+        dummies = dict()
+        for column, prefix in columns_and_prefixes:
+            levels = [name[len(prefix)+1:] for name in dummy_names if name.startswith(prefix + "_")]
+            dummies[column] = (prefix, levels)
+        return cls(features, dummies, mean, scale)
+
+    def transform(self, batch):
+        """Float32 feature rows for a DataFrame, a dict of column arrays, or a dict of one row's values"""
+        columns = {column: np.atleast_1d(np.asarray(batch[column])) for column in self.input_columns}
+        n_rows = len(columns[self.input_columns[0]])
+        X_T = np.zeros((len(self.features), n_rows), dtype=np.float32) # filled feature by feature, so each write is contiguous
+        for feature, position in zip(self.plain_features, self.plain_positions):
+            X_T[position] = columns[feature]
+        for column, level_positions in self.level_positions.items():
+            values = columns[column].astype(str) # fixed-width strings compare in C, object arrays don't
+            for level, position in level_positions.items():
+                X_T[position] = values == level # unseen levels (and NaN) leave every dummy 0, as get_dummies does
+        X = np.ascontiguousarray(X_T.T)
+        if self.mean is not None:
+            X -= self.mean
+            X /= self.scale
+        return X
+
+    def save(self, path):
+        """Write the artifact as json"""
+        artifact = {
+            'version': preprocessing_version,
+            'features': self.features,
+            'dummies': {column: {'prefix': prefix, 'levels': levels} for column, (prefix, levels) in self.dummies.items()},
+            'mean': self.mean.tolist() if self.mean is not None else None,
+            'scale': self.scale.tolist() if self.scale is not None else None,
+        }
+        with open(path, "w") as f:
+            json.dump(artifact, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved artifact"""
+        with open(path, "r") as f:
+            artifact = json.load(f)
+        if artifact['version'] != preprocessing_version:
+            raise ValueError(f"{path} is preprocessing version {artifact['version']}, expected {preprocessing_version}")
+        dummies = {column: (dummy['prefix'], dummy['levels']) for column, dummy in artifact['dummies'].items()}
+        return cls(artifact['features'], dummies, artifact['mean'], artifact['scale'])
+
+def get_preprocessing_path(model_path):
+    """Path of the artifact saved beside a model"""
+    return os.path.splitext(model_path)[0] + "_preprocessing.json"
+
+def load_preprocessor(model_path):
+    """Load the artifact saved beside a model"""
+    return Preprocessor.load(get_preprocessing_path(model_path))
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    args = parser.parse_args()
+
+    # Write the artifact for a simple model saved before artifacts existed (it was trained unscaled, on every count)
+    import stream_data
+    from fit import get_features
+    dummies = {'count': (stream_data.dummy_prefixes['count'], stream_data.dummy_levels['count'])}
+    features = get_features(stream_data.get_dummy_names(['count']), simple=True)
+    Preprocessor(features, dummies).save(get_preprocessing_path(args.model_path))
@@ -0,0 +1,98 @@
+import os
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import stream_data
+from backtest import get_model, get_season_path
+
+key_columns = ['game_id', 'at_bat_index', 'ab_pitch_count'] # one pitch
+
+## Scoring
+def score_chunk(chunk, model_path, keys=key_columns, batch_size=8192):
+    """Keys and pitch type probabilities for every row of a chunk"""
+    model, preprocessor = get_model(model_path)
+    X = preprocessor.transform(chunk)
+    probs = np.empty((len(X), len(stream_data.pitch_types)), dtype=np.float32)
+    for start in range(0, len(X), batch_size):
+        probs[start:start+batch_size] = model.predict(X[start:start+batch_size])
+    scores = chunk[keys].reset_index(drop=True)
+    scores[stream_data.pitch_types] = probs
+    return scores
+
+class ScoreWriter:
+    """Append score chunks to a .parquet (one row group per chunk) or .csv file"""
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.writer = None
+        self.rows = 0
+
+    def write(self, scores):
+        """Append one chunk"""
+        if self.output_path.endswith(".parquet"):
+            import pyarrow as pa, pyarrow.parquet as pq
+            table = pa.Table.from_pandas(scores, preserve_index=False)
+            self.writer = self.writer or pq.ParquetWriter(self.output_path, table.schema)
+            self.writer.write_table(table)
+        else:
+            scores.to_csv(self.output_path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False)
+        self.rows += len(scores)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def score_season(season_path, model_path, output_path, keys=key_columns, chunk_size=100_000, processes=1):
+    """Score a season store chunk by chunk, writing keys and probabilities in input order"""
+    from preprocessing import load_preprocessor
+    columns = list(dict.fromkeys(load_preprocessor(model_path).input_columns + list(keys)))
+    writer = ScoreWriter(output_path)
+    start = time.perf_counter()
+
+    def report():
+        """Helper: print progress"""
+        seconds = time.perf_counter() - start
+        print(f"{writer.rows:>10} rows {seconds:8.1f}s {writer.rows / seconds:12,.0f} rows/s")
+
+    try:
+        if processes > 1:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(processes, mp_context=context) as executor:
+                in_flight = deque()
+                for chunk in stream_data.iter_chunks(season_path, columns, chunk_size):
+                    in_flight.append(executor.submit(score_chunk, chunk, model_path, list(keys)))
+                    if len(in_flight) >= 2 * processes:
+                        writer.write(in_flight.popleft().result()) # in submission order
+                        report()
+                for future in in_flight:
+                    writer.write(future.result())
+                    report()
+        else:
+            for chunk in stream_data.iter_chunks(season_path, columns, chunk_size):
+                writer.write(score_chunk(chunk, model_path, list(keys)))
+                report()
+    finally:
+        writer.close()
+    return writer.rows, time.perf_counter() - start
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--season", type=int, default=None)
+    parser.add_argument("-i", "--input_path", type=str, default=None, help="season store to score instead of data/<season>")
+    parser.add_argument("-m", "--model_path", type=str, default="model/saved_models/fit_model_simple.h5")
+    parser.add_argument("-o", "--output_path", type=str, default=None, help=".parquet or .csv (default: data/<season>_scores.parquet)")
+    parser.add_argument("-k", "--keys", nargs="+", default=key_columns, help="season store columns to write beside the probabilities")
+    parser.add_argument("-c", "--chunk_size", type=int, default=100_000)
+    parser.add_argument("-n", "--processes", type=int, default=1)
+    args = parser.parse_args()
+    if (args.season is None) == (args.input_path is None):
+        parser.error("give one of --season or --input_path")
+
+    # Score and report
+    input_path = args.input_path or get_season_path(args.season)
+    output_path = args.output_path or os.path.join(os.path.dirname(input_path), f"{os.path.splitext(os.path.basename(input_path))[0]}_scores.parquet")
+    rows, seconds = score_season(input_path, args.model_path, output_path, args.keys, args.chunk_size, args.processes)
+    print(f"Scored {rows} rows in {seconds:.1f}s ({rows / seconds:,.0f} rows/s) to {output_path}")
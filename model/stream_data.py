@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from preprocessing import Preprocessor
+
+## Fixed vocabularies (so chunks encode identically without seeing all the data)
+pitch_types = ['fastball', 'curveball', 'sinker', 'cutter', 'changeup', 'slider', 'splitter', 'knuckle_curve', 'other'] # target order
+dummy_levels = {
+    'count': [f"({balls},{strikes})" for balls in range(4) for strikes in range(3)],
+    'pitch_type_lag_1': sorted(pitch_types + ['none']),
+    'pitch_type_lag_2': sorted(pitch_types + ['none']),
+}
+dummy_prefixes = {'count': 'count', 'pitch_type_lag_1': 'lag_1', 'pitch_type_lag_2': 'lag_2'}
+
+def get_dummy_names(dummy_columns):
+    """Dummy feature names, in the order fit.get_dummies gives them when every level is present"""
+    return [f"{dummy_prefixes[column]}_{level}" for column in dummy_columns for level in dummy_levels[column]]
+
+## Reading
+def iter_chunks(season_path, columns, chunk_size=100_000):
+    """Yield a season store (parquet or csv) as dataframes of at most chunk_size rows"""
+    if season_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(season_path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(season_path, usecols=columns, chunksize=chunk_size)
+
+def encode_chunk(df, encoder):
+    """Feature rows and one-hot targets for a chunk"""
+    df = df.loc[df['raw_pitch_type'] != "other"].dropna(subset=encoder.plain_features)
+    X = encoder.transform(df)
+    y = np.zeros((len(df), len(pitch_types)), dtype=np.float32)
+    codes = pd.Categorical(df['pitch_type'], categories=pitch_types).codes
+    y[np.arange(len(df))[codes >= 0], codes[codes >= 0]] = 1
+    return X, y
+
+## Scaling
+class Scaler:
+    """Standard scaling from mean/scale arrays, saved as .npz"""
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    def transform(self, X):
+        """Scale X in place"""
+        X -= self.mean
+        X /= self.scale
+        return X
+
+    def save(self, path, features):
+        """Write mean, scale and the features they apply to"""
+        np.savez(path, mean=self.mean, scale=self.scale, features=np.array(features))
+
+    @classmethod
+    def load(cls, path, features):
+        """Read a saved scaler, checking it was fit on the same features"""
+        with np.load(path) as arrays:
+            if list(arrays['features']) != list(features):
+                raise ValueError(f"Scaler at {path} was fit on different features")
+            return cls(arrays['mean'], arrays['scale'])
+
+## Streaming
+class SeasonStream:
+    """Training and validation data streamed from season stores chunk by chunk"""
+    def __init__(self, season_paths, features, dummy_columns, chunk_size=100_000, val_fraction=0.25, seed=0, scale=True, scaler=None, scaler_path=None):
+        self.season_paths = list(season_paths)
+        self.features = list(features)
+        self.dummies = {column: (dummy_prefixes[column], dummy_levels[column]) for column in dummy_columns}
+        self.encoder = Preprocessor(self.features, self.dummies)
+        self.columns = self.encoder.input_columns + ['pitch_type', 'raw_pitch_type']
+        self.chunk_size = chunk_size
+        self.val_fraction = val_fraction
+        self.seed = seed
+        self.rows_read = {'train': 0, 'val': 0} # rows fed to datasets so far, for throughput
+        self.scaler = (scaler or self.fit_scaler(scaler_path)) if scale else None
+
+    def iter_encoded(self, subset):
+        """Helper: yield (X, y) for the "train" or "val" rows of each chunk, unscaled"""
+        chunk_index = 0
+        for season_path in self.season_paths:
+            for df in iter_chunks(season_path, self.columns, self.chunk_size):
+                X, y = encode_chunk(df, self.encoder)
+                val = np.random.default_rng([self.seed, chunk_index]).random(len(X)) < self.val_fraction
+                keep = val if subset == "val" else ~val
+                chunk_index += 1
+                yield X[keep], y[keep]
+
+    def fit_scaler(self, scaler_path=None):
+        """Fit a scaler on the training rows (saving it to scaler_path)"""
+        n, total, total_squares = 0, np.zeros(len(self.features)), np.zeros(len(self.features))
+        shift = None # sums around the first row keep the variance accurate
+        for X, _ in self.iter_encoded("train"):
+            if not len(X):
+                continue
+            if shift is None:
+                shift = X[0].astype(np.float64)
+            n += len(X)
+            total += (X - shift).sum(axis=0, dtype=np.float64)
+            total_squares += np.square(X - shift, dtype=np.float64).sum(axis=0)
+        mean = total / n
+        scale = np.sqrt(np.maximum(total_squares / n - mean ** 2, 0))
+        scale[scale == 0] = 1 # as StandardScaler does for constant features
+        scaler = Scaler(mean + shift, scale)
+        if scaler_path is not None:
+            scaler.save(scaler_path, self.features)
+        return scaler
+
+    def get_preprocessor(self):
+        """Preprocessing artifact for models trained on this stream"""
+        if self.scaler is None:
+            return self.encoder
+        return Preprocessor(self.features, self.dummies, self.scaler.mean, self.scaler.scale)
+
+    def iter_arrays(self, subset, shuffle=False):
+        """Yield scaled float32 (X, y) arrays for each chunk's "train" or "val" rows, shuffled within the chunk if asked"""
+        rng = np.random.default_rng()
+        for X, y in self.iter_encoded(subset):
+            if self.scaler is not None:
+                X = self.scaler.transform(X)
+            if shuffle:
+                order = rng.permutation(len(X))
+                X, y = X[order], y[order]
+            yield X, y
+
+    def get_dataset(self, subset, batch_size, shuffle_batches=64):
+        """tf.data pipeline of (X, y) batches over the "train" (shuffled) or "val" rows, prefetching the next chunk"""
+        import tensorflow as tf
+        shuffle = subset == "train"
+        def generate():
+            for X, y in self.iter_arrays(subset, shuffle=shuffle):
+                self.rows_read[subset] += len(X)
+                for start in range(0, len(X), batch_size):
+                    yield X[start:start + batch_size], y[start:start + batch_size]
+        signature = (tf.TensorSpec((None, len(self.features)), tf.float32), tf.TensorSpec((None, len(pitch_types)), tf.float32))
+        dataset = tf.data.Dataset.from_generator(generate, output_signature=signature)
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_batches) # mixes batches across neighbouring chunks
+        return dataset.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from tensorflow import keras
+from memory import get_rss_mb, get_max_rss_mb
+
+## Stages
+class TrainingProfiler:
+    """Per-stage wall time and peak memory, and training throughput, as one JSON report"""
+    def __init__(self, sample_seconds=0.05):
+        self.stages = list()
+        self.trials = list()
+        self.started = time.time()
+        self.sample_seconds = sample_seconds
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block and record its peak memory"""
+        samples = [get_rss_mb()]
+        done = threading.Event()
+        def sample():
+            while not done.wait(self.sample_seconds):
+                samples.append(get_rss_mb())
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            done.set()
+            sampler.join()
+        samples.append(get_rss_mb())
+        self.stages.append({
+            'stage': name,
+            'seconds': seconds,
+            'start_rss_mb': samples[0],
+            'peak_rss_mb': max(samples),
+            'max_rss_mb': get_max_rss_mb(),
+        })
+
+    def get_callback(self, n_samples):
+        """Keras callback recording each trial's epoch throughput"""
+        return ThroughputCallback(self, n_samples)
+
+    def report(self):
+        """Stages and trials as a dict"""
+        return {'started': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)), 'stages': self.stages, 'trials': self.trials}
+
+    def write(self, path):
+        """Write the report as JSON"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2, default=float)
+
+## Epochs
+class ThroughputCallback(keras.callbacks.Callback):
+    """Helper: time each fit call and epoch"""
+    def __init__(self, profiler, n_samples):
+        super().__init__()
+        self.profiler = profiler
+        self.n_samples = n_samples
+        self.train_end = None
+
+    def __deepcopy__(self, memo):
+        return self # keras_tuner copies callbacks for each trial; keep recording into the same profiler
+
+    def on_train_begin(self, logs=None):
+        self.trial = {'trial': len(self.profiler.trials), 'epochs': list()}
+        self.profiler.trials.append(self.trial)
+        self.trial_start = time.perf_counter()
+        self.samples_read = self.get_samples_read()
+
+    def get_samples_read(self):
+        """Helper: training rows read so far, when they're counted as they stream"""
+        return self.n_samples() if callable(self.n_samples) else None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+        self.train_end = None
+
+    def on_test_begin(self, logs=None):
+        if self.train_end is None: # fit's validation pass: the epoch's training batches are done
+            self.train_end = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        end = time.perf_counter()
+        train_end = self.train_end or end
+        if callable(self.n_samples):
+            samples_read = self.get_samples_read()
+            n_samples, self.samples_read = samples_read - self.samples_read, samples_read
+        else:
+            n_samples = self.n_samples
+        train_seconds = train_end - self.epoch_start
+        self.trial['epochs'].append({
+            'epoch': epoch,
+            'seconds': end - self.epoch_start,
+            'train_seconds': train_seconds,
+            'val_seconds': end - train_end,
+            'samples': n_samples,
+            'samples_per_second': n_samples / train_seconds if n_samples else None,
+            **(logs or {}),
+        })
+
+    def on_train_end(self, logs=None):
+        self.trial['seconds'] = time.perf_counter() - self.trial_start
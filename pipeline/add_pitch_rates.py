@@ -1,14 +1,51 @@
 import pandas as pd
 import numpy as np
 
-def add_pitcher_pitch_rates(df, min_pitches=100):
+def add_pitcher_pitch_rates(df, min_pitches=100, prior_counts=None, prior_season_pitches=None):
     """For each pitch, add pitcher's frequency of each pitch-type from all previous pitches"""
     df['nth_season_pitch'] = df.groupby('pitcher_id').cumcount() + 1
-    pitch_types = df['pitch_type'].unique()
-    pitch_type_dummies = pd.get_dummies(df[['pitcher_id', 'pitch_type']], columns=['pitch_type'], prefix='', prefix_sep='')
-    pitch_type_counts = pitch_type_dummies.groupby('pitcher_id').cumsum()
-    pitch_type_rates = pitch_type_counts[pitch_types].divide(df['nth_season_pitch'], axis=0)
-    pitch_type_rates.columns = [x+"_rate" for x in pitch_type_rates.columns]
-    df = df.join(pitch_type_rates)
-    df.loc[df['nth_season_pitch'] < min_pitches, list(pitch_type_rates.columns)] = np.nan
+    if prior_season_pitches is not None:
+        df['nth_season_pitch'] += df['pitcher_id'].map(prior_season_pitches).fillna(0).astype(np.int64).to_numpy()
+    pitch_types = list(df['pitch_type'].unique())
+    if prior_counts is not None:
+        pitch_types += [pitch_type for pitch_type in prior_counts.columns if pitch_type not in pitch_types]
+    type_codes = pd.Categorical(df['pitch_type'], categories=pitch_types).codes
+    pitcher_codes, pitcher_ids = pd.factorize(df['pitcher_id'])
+
+    # Sort by pitcher once (stable, so each pitcher's pitches stay in order)
+    order = np.argsort(pitcher_codes, kind='stable')
+    sorted_pitchers = pitcher_codes[order]
+    new_pitcher = np.ones(len(df), dtype=bool)
+    new_pitcher[1:] = sorted_pitchers[1:] != sorted_pitchers[:-1]
+    positions = np.arange(len(df))
+    pitcher_start = np.maximum.accumulate(np.where(new_pitcher, positions, 0))
+
+    # Counts carried from earlier seasons
+    if prior_counts is not None:
+        prior_counts = prior_counts.reindex(index=pitcher_ids, columns=pitch_types, fill_value=0).to_numpy()
+    else:
+        prior_counts = np.zeros((len(pitcher_ids), len(pitch_types)), dtype=np.int64)
+    totals = positions - pitcher_start + prior_counts.sum(axis=1)[sorted_pitchers] # pitches before each pitch
+    too_few = totals < max(min_pitches, 1)
+
+    # Running count of each pitch type within each pitcher's pitches
+    sorted_type_codes = type_codes[order]
+    for code, pitch_type in enumerate(pitch_types):
+        is_type = sorted_type_codes == code
+        type_counts = np.cumsum(is_type, dtype=np.int64) - is_type # pitches of this type before each pitch
+        type_counts -= type_counts[pitcher_start] # restart count at each pitcher
+        type_counts += prior_counts[sorted_pitchers, code]
+        sorted_rates = (type_counts / np.maximum(totals, 1)).astype(np.float32)
+        sorted_rates[too_few] = np.nan
+        rates = np.empty(len(df), dtype=np.float32)
+        rates[order] = sorted_rates
+        df[f"{pitch_type}_rate"] = rates
     return df
+
+def get_pitcher_pitch_counts(df, prior_counts=None):
+    """Count each pitcher's pitches of each type (plus prior_counts)"""
+    counts = pd.crosstab(df['pitcher_id'], df['pitch_type'])
+    if prior_counts is not None:
+        counts = counts.add(prior_counts, fill_value=0).astype(np.int64)
+    counts.columns = list(counts.columns)
+    return counts
@@ -0,0 +1,238 @@
+import pull_from_api, convert_to_dataframe, feature_engineering, add_pitch_rates, pitcher_level_info, schema
+from main import write_season
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import statsapi
+
+stages = ['raw', 'features', 'rates']
+worker_state = dict() # set in each worker process by init_worker
+
+## Shared fetch budget
+class SharedRateLimiter:
+    """RateLimiter whose request slots are shared by every process in the pool"""
+    def __init__(self, max_per_second, next_time, lock):
+        self.interval = 1 / max_per_second if max_per_second else 0
+        self.next_time = next_time # multiprocessing.Value('d')
+        self.lock = lock # multiprocessing.Lock
+
+    def wait(self):
+        """Block until the next request slot is free"""
+        with self.lock:
+            now = time.monotonic() # system-wide clock, so comparable across processes
+            wait_time = self.next_time.value - now
+            self.next_time.value = max(now, self.next_time.value) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+def init_worker(max_per_second, next_time, lock):
+    """Give the worker the pool's shared rate limiter"""
+    worker_state['rate_limiter'] = SharedRateLimiter(max_per_second, next_time, lock)
+
+## Checkpoints
+def get_checkpoint_dir(data_dir, season):
+    """Helper: where a season's stage outputs are kept until its store is written"""
+    return os.path.join(data_dir, "checkpoints", str(season))
+
+def get_done_stages(season, options):
+    """Stages whose output already exists for season"""
+    season_path = os.path.join(options['data_dir'], f"{season}.{options['store_format']}")
+    checkpoint_dir = get_checkpoint_dir(options['data_dir'], season)
+    if os.path.exists(season_path) and not os.path.exists(os.path.join(checkpoint_dir, "rebuild")):
+        return list(stages)
+    done = list()
+    for stage in stages[:-1]:
+        if not os.path.exists(os.path.join(checkpoint_dir, f"{stage}.done")):
+            break
+        done.append(stage)
+    return done
+
+def start_rebuild(season, options):
+    """Helper: mark a season store for rebuilding and clear stale checkpoints"""
+    season_path = os.path.join(options['data_dir'], f"{season}.{options['store_format']}")
+    checkpoint_dir = get_checkpoint_dir(options['data_dir'], season)
+    rebuild_path = os.path.join(checkpoint_dir, "rebuild")
+    if not os.path.exists(season_path) or os.path.exists(rebuild_path):
+        return
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir)
+    open(rebuild_path, "w").close()
+
+def mark_done(checkpoint_dir, stage, seconds):
+    """Helper: record a finished stage (written last, so a crash mid-stage reruns it)"""
+    with open(os.path.join(checkpoint_dir, f"{stage}.done"), "w") as f:
+        json.dump({'seconds': seconds}, f)
+
+## Stages
+def run_stage(season, stage, options):
+    """Run one stage for one season from the previous stage's checkpoint, returning (season, stage, seconds, rows)"""
+    start = time.perf_counter()
+    checkpoint_dir = get_checkpoint_dir(options['data_dir'], season)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    if stage == 'raw':
+        rows = run_raw(season, checkpoint_dir, options)
+    elif stage == 'features':
+        rows = run_features(checkpoint_dir)
+    else:
+        rows = run_rates(season, checkpoint_dir, options)
+    seconds = time.perf_counter() - start
+    if stage != 'rates':
+        mark_done(checkpoint_dir, stage, seconds)
+    return season, stage, seconds, rows
+
+def run_raw(season, checkpoint_dir, options):
+    """Fetch and parse a season, writing each raw batch and the player names"""
+    raw_dir = os.path.join(checkpoint_dir, "raw")
+    shutil.rmtree(raw_dir, ignore_errors=True) # drop parts from an interrupted run
+    os.makedirs(raw_dir)
+    play_by_plays = pull_from_api.iter_season_play_by_play(season, options['fetch_workers'], cache_dir=options['cache_dir'], refresh=options['refresh'], api_get=options['api_get'], rate_limiter=worker_state.get('rate_limiter'))
+    rows, player_names = 0, list()
+    for i, raw_batch in enumerate(convert_to_dataframe.iter_raw_data_frames(play_by_plays, options['batch_size'])):
+        raw_batch, batch_names = schema.split_player_names(schema.enforce(raw_batch, 'raw'))
+        raw_batch.to_parquet(os.path.join(raw_dir, f"part_{i:05d}.parquet"), index=False)
+        player_names.append(batch_names)
+        rows += len(raw_batch)
+    schema.combine_player_names(player_names).to_csv(os.path.join(raw_dir, "players.csv"))
+    return rows
+
+def run_features(checkpoint_dir):
+    """Create features batch by batch, as main does, appending each batch to the features file as a row group"""
+    part_paths = sorted(glob.glob(os.path.join(checkpoint_dir, "raw", "part_*.parquet")))
+    rows, writer = 0, None
+    try:
+        for part_path in part_paths:
+            features_part = schema.enforce(feature_engineering.create_features(pd.read_parquet(part_path)), 'features')
+            table = pa.Table.from_pandas(features_part, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(os.path.join(checkpoint_dir, "features.parquet"), get_part_schema(table))
+            writer.write_table(table.cast(writer.schema))
+            rows += len(features_part)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def get_part_schema(table):
+    """Helper: table's schema with int32 categorical codes, so every batch fits it however many categories it has"""
+    fields = [field.with_type(pa.dictionary(pa.int32(), field.type.value_type)) if pa.types.is_dictionary(field.type) else field for field in table.schema]
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+def run_rates(season, checkpoint_dir, options):
+    """Add pitch rates, write the season store, player names and pitch counts, and clear the season's checkpoints"""
+    data_dir = options['data_dir']
+    features_df = schema.enforce(pd.read_parquet(os.path.join(checkpoint_dir, "features.parquet")), 'features')
+    player_names = pd.read_csv(os.path.join(checkpoint_dir, "raw", "players.csv"), index_col='player_id')
+    prior_counts = None
+    if options['carry_rates']:
+        prior_counts_path = os.path.join(data_dir, f"pitch_counts_{season-1}.csv")
+        if not os.path.exists(prior_counts_path):
+            raise Exception(f"No pitch counts for {season-1}. Build that season first, or include it in the range")
+        prior_counts = pd.read_csv(prior_counts_path, index_col='pitcher_id')
+    season_df = schema.enforce(add_pitch_rates.add_pitcher_pitch_rates(features_df, prior_counts=prior_counts), 'season')
+    season_path = os.path.join(data_dir, f"{season}.{options['store_format']}")
+    write_season(season_df, season_path + ".tmp", options['store_format'])
+    os.replace(season_path + ".tmp", season_path)
+    player_names.to_csv(os.path.join(data_dir, f"players_{season}.csv"))
+    add_pitch_rates.get_pitcher_pitch_counts(season_df).to_csv(os.path.join(data_dir, f"pitch_counts_{season}.csv")) # the season's own pitches, as main.py writes them
+    if options['pitcher_info']:
+        pitcher_level_info.get_pitcher_level_info(season_df, player_names).to_csv(os.path.join(data_dir, f"pitcher_level_info_{season}.csv"), index=True)
+    rebuild_path = os.path.join(checkpoint_dir, "rebuild")
+    if options['keep_checkpoints']:
+        if os.path.exists(rebuild_path):
+            os.remove(rebuild_path) # written last, so the season counts as built only once everything is
+    else:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return len(season_df)
+
+## Driver
+def backfill(seasons, processes=2, mp_context="spawn", **options):
+    """Build every season's store across a process pool, resuming from checkpoints"""
+    seasons = sorted(seasons)
+    options = dict({'fetch_workers': 4, 'max_per_second': None, 'cache_dir': None, 'refresh': False, 'api_get': statsapi.get, 'batch_size': 100_000,
+                    'store_format': 'parquet', 'carry_rates': False, 'pitcher_info': False, 'overwrite': False, 'keep_checkpoints': False}, **options)
+    if options['overwrite']:
+        for season in seasons:
+            start_rebuild(season, options)
+    next_stage = dict()
+    for season in seasons:
+        done = get_done_stages(season, options)
+        next_stage[season] = stages[len(done)] if len(done) < len(stages) else None
+        if done:
+            print(f"{season}: resuming after {done[-1]}")
+    total = sum(len(stages) - (stages.index(stage) if stage else len(stages)) for stage in next_stage.values())
+
+    def ready(season):
+        """Helper: whether season's next stage can start now"""
+        if next_stage[season] != 'rates' or not options['carry_rates'] or season - 1 not in next_stage:
+            return True
+        return next_stage[season - 1] is None # previous season finished, so its counts exist
+
+    context = multiprocessing.get_context(mp_context)
+    next_time, lock = context.Value('d', 0.0), context.Lock()
+    report, running = list(), dict()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(processes, mp_context=context, initializer=init_worker, initargs=(options['max_per_second'], next_time, lock)) as executor:
+        while any(stage is not None for stage in next_stage.values()):
+            for season in seasons:
+                if next_stage[season] is not None and season not in running and ready(season):
+                    running[season] = executor.submit(run_stage, season, next_stage[season], options)
+            finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                season, stage, seconds, rows = future.result()
+                del running[season]
+                next_index = stages.index(stage) + 1
+                next_stage[season] = stages[next_index] if next_index < len(stages) else None
+                report.append({'season': season, 'stage': stage, 'seconds': seconds, 'rows': rows})
+                print(f"{season}: {stage:<8} {seconds:8.1f}s {rows:>9} rows   [{len(report)}/{total} stages, {time.perf_counter() - start:.0f}s elapsed]")
+    return report
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--first_season", type=int)
+    parser.add_argument("-l", "--last_season", type=int)
+    parser.add_argument("-n", "--processes", type=int, default=2, help="seasons' stages run in this many processes")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="games fetched concurrently per process")
+    parser.add_argument("-r", "--max_per_second", type=float, default=None, help="cap on api requests per second, shared by all processes")
+    parser.add_argument("-b", "--batch_size", type=int, default=100_000, help="pitches parsed per batch")
+    parser.add_argument("--format", choices=['parquet', 'csv'], default='parquet', help="season store format (csv for export)")
+    parser.add_argument("-c", "--carry_rates", action='store_true', help="start pitchers' rates from last season's pitch counts")
+    parser.add_argument("-p", "--pitcher_info", action='store_true')
+    parser.add_argument("-o", "--overwrite", action='store_true', help="rebuild seasons whose stores exist (an interrupted rebuild resumes from its checkpoints on the next run)")
+    parser.add_argument("--keep_checkpoints", action='store_true', help="keep stage outputs after a season's store is written")
+    parser.add_argument("--no_cache", action='store_true', help="don't read or write the raw play-by-play cache")
+    parser.add_argument("--refresh_cache", action='store_true', help="re-download games already in the raw play-by-play cache")
+    args = parser.parse_args()
+
+    # Backfill and report
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+    report = backfill(
+        range(args.first_season, args.last_season + 1),
+        processes=args.processes,
+        data_dir=data_dir,
+        fetch_workers=args.workers,
+        max_per_second=args.max_per_second,
+        cache_dir=None if args.no_cache else os.path.join(data_dir, "raw"),
+        refresh=args.refresh_cache,
+        batch_size=args.batch_size,
+        store_format=args.format,
+        carry_rates=args.carry_rates,
+        pitcher_info=args.pitcher_info,
+        overwrite=args.overwrite,
+        keep_checkpoints=args.keep_checkpoints,
+    )
+    for stage in stages:
+        stage_seconds = [entry['seconds'] for entry in report if entry['stage'] == stage]
+        if stage_seconds:
+            print(f"{stage:<8} {len(stage_seconds)} seasons   total {sum(stage_seconds):8.1f}s   mean {sum(stage_seconds)/len(stage_seconds):8.1f}s")
+    os.makedirs(os.path.join(data_dir, "checkpoints"), exist_ok=True)
+    with open(os.path.join(data_dir, "checkpoints", "backfill_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,163 @@
+import synthetic, convert_to_dataframe, feature_engineering, add_pitch_rates, online_features, schema
+import time
+import tracemalloc
+import argparse
+import numpy as np
+import pandas as pd
+from dataclasses import asdict
+
+## Reference implementations, kept to check outputs and measure speedups
+def reference_create_raw_data_frame(season_data):
+    """Original per-at-bat implementation of convert_to_dataframe.create_raw_data_frame"""
+    at_bat_dfs = list()
+    for game_id, at_bats in season_data.items():
+        for at_bat_idx, at_bat in at_bats.items():
+            pitches = at_bat.pitches
+            if len(pitches) == 0:
+                continue
+            at_bat_dict = asdict(at_bat)
+            at_bat_level_info = pd.Series({'game_id': game_id} | at_bat_dict).drop('pitches')
+            at_bat_df = pd.concat([at_bat_level_info]*len(pitches), axis=1).T
+            at_bat_df['balls'] = [pitch.count['balls'] for pitch in pitches]
+            at_bat_df['strikes'] = [pitch.count['strikes'] for pitch in pitches]
+            at_bat_df['pitch_type'] = [pitch.pitch_type for pitch in pitches]
+            at_bat_df['at_bat'] = at_bat_idx
+            at_bat_dfs.append(at_bat_df)
+    season_df = pd.concat(at_bat_dfs)
+    season_df = season_df.loc[(season_df['balls'] <= 3) & (season_df['strikes'] <= 2)]
+    season_df.reset_index(drop=True, inplace=True)
+    return season_df
+
+def reference_create_features(season_df):
+    """Original one-feature-at-a-time implementation of feature_engineering.create_features"""
+    season_df = feature_engineering.clean_pitch_type(season_df)
+    season_df['count'] = ("(" + season_df['balls'].astype(str) + "," + season_df['strikes'].astype(str) + ")")
+    season_df = feature_engineering.get_last_pitch_type(season_df)
+    season_df = feature_engineering.get_previous_balls_and_strikes(season_df)
+    season_df = feature_engineering.get_pitch_count(season_df)
+    season_df = feature_engineering.get_inning_pitch_count(season_df)
+    season_df = feature_engineering.get_at_bat_pitch_count(season_df)
+    season_df = feature_engineering.get_at_bat_pitches(season_df)
+    return season_df
+
+def reference_add_pitcher_pitch_rates(df, min_pitches=100):
+    """Original get_dummies implementation of add_pitcher_pitch_rates"""
+    df['nth_season_pitch'] = df.groupby('pitcher_id').cumcount() + 1
+    pitch_types = df['pitch_type'].unique()
+    pitch_type_dummies = pd.get_dummies(df[['pitcher_id', 'pitch_type']], columns=['pitch_type'], prefix='', prefix_sep='')
+    pitch_type_counts = pitch_type_dummies.groupby('pitcher_id').cumsum() - pitch_type_dummies.drop(columns='pitcher_id')
+    pitch_type_rates = pitch_type_counts[pitch_types].divide(df['nth_season_pitch'] - 1, axis=0)
+    pitch_type_rates.columns = [x+"_rate" for x in pitch_type_rates.columns]
+    df = df.join(pitch_type_rates)
+    df.loc[df['nth_season_pitch'] - 1 < min_pitches, list(pitch_type_rates.columns)] = np.nan
+    return df
+
+## Synthetic seasons
+def stack_seasons(season_df, n_seasons):
+    """Helper: repeat a raw season dataframe n_seasons times with distinct game IDs"""
+    game_id_offset = season_df['game_id'].max() + 1
+    season_dfs = [season_df.assign(game_id=season_df['game_id'] + i*game_id_offset) for i in range(n_seasons)]
+    return pd.concat(season_dfs, ignore_index=True)
+
+## Timing and memory
+def get_peak_memory(func, *args):
+    """Helper: peak memory numpy/pandas allocate while running func(*args)"""
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def time_it(func, *args, repeat=1):
+    """Helper: best wall time of func(*args) over repeat runs, and its output"""
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), output
+
+def compare(name, reference_func, func, args, check, repeat=1):
+    """Time a reference and optimized implementation, check they agree, and report"""
+    reference_time, reference_output = time_it(reference_func, *args, repeat=repeat)
+    new_time, new_output = time_it(func, *args, repeat=repeat)
+    check(new_output, reference_output)
+    print(f"{name:<28} reference {reference_time:8.3f}s   new {new_time:8.3f}s   speedup {reference_time/new_time:6.1f}x")
+    return reference_time, new_time
+
+## Benchmarks
+def benchmark_create_raw_data_frame(season_data, repeat=1):
+    """Benchmark convert_to_dataframe.create_raw_data_frame"""
+    def check(new_df, reference_df):
+        pd.testing.assert_frame_equal(new_df.astype(object), reference_df.astype(object))
+    return compare("create_raw_data_frame", reference_create_raw_data_frame, convert_to_dataframe.create_raw_data_frame, (season_data,), check, repeat)
+
+def benchmark_create_features(raw_df, seasons=(1,), repeat=1):
+    """Benchmark feature_engineering.create_features over 1+ stacked seasons"""
+    def check(new_df, reference_df):
+        pd.testing.assert_frame_equal(new_df, reference_df)
+    for n_seasons in seasons:
+        stacked_df = stack_seasons(raw_df, n_seasons)
+        copy_and = lambda func: (lambda: func(stacked_df.copy()))
+        compare(f"create_features ({n_seasons} season{'s'*(n_seasons > 1)})", copy_and(reference_create_features), copy_and(feature_engineering.create_features), (), check, repeat)
+
+def benchmark_add_pitcher_pitch_rates(raw_df, seasons=(1,), repeat=1):
+    """Benchmark add_pitch_rates.add_pitcher_pitch_rates (time and peak traced memory) over 1+ stacked seasons"""
+    def check(new_df, reference_df):
+        rate_columns = [column for column in reference_df.columns if column.endswith("_rate")]
+        pd.testing.assert_frame_equal(new_df, reference_df.astype({column: np.float32 for column in rate_columns}))
+    features_df = feature_engineering.create_features(raw_df.copy())
+    for n_seasons in seasons:
+        stacked_df = stack_seasons(features_df, n_seasons)
+        for name, func in (('reference', reference_add_pitcher_pitch_rates), ('new', add_pitch_rates.add_pitcher_pitch_rates)):
+            peak = get_peak_memory(func, stacked_df.copy())
+            print(f"{'add_pitcher_pitch_rates':<28} {name:<9} peak traced memory {peak/2**20:8.1f}MB")
+        copy_and = lambda func: (lambda: func(stacked_df.copy()))
+        compare(f"add_pitcher_pitch_rates ({n_seasons})", copy_and(reference_add_pitcher_pitch_rates), copy_and(add_pitch_rates.add_pitcher_pitch_rates), (), check, repeat)
+
+def benchmark_online_features(raw_df, simple=False):
+    """Check online features match the batch pipeline and time ingest per pitch"""
+    batch_df = add_pitch_rates.add_pitcher_pitch_rates(feature_engineering.create_features(raw_df.copy()))
+    dummy_df = pd.get_dummies(batch_df[['count', 'pitch_type_lag_1', 'pitch_type_lag_2']], prefix=['count', 'lag_1', 'lag_2']) # as in model/fit.get_dummies
+    batch_df = batch_df.join(dummy_df)
+    feature_names = [name for name in online_features.get_feature_names(simple) if name in batch_df.columns]
+    batch_X = batch_df[feature_names].astype(float).to_numpy()
+    online_time, online_X = time_it(online_features.replay_season, raw_df, feature_names)
+    np.testing.assert_array_equal(online_X, batch_X)
+    print(f"{'online_features':<28} {len(raw_df)} pitches   {1e6*online_time/len(raw_df):6.1f}us/pitch   matches batch features")
+
+def benchmark_schema(raw_df):
+    """Check the declared schema keeps a season's values, and compare its memory with the pipeline's loose dtypes"""
+    loose_df = add_pitch_rates.add_pitcher_pitch_rates(feature_engineering.create_features(raw_df.copy()))
+    raw_df, player_names = schema.split_player_names(schema.enforce(raw_df.copy(), 'raw'))
+    compact_df = schema.enforce(feature_engineering.create_features(raw_df), 'features')
+    compact_df = schema.enforce(add_pitch_rates.add_pitcher_pitch_rates(compact_df), 'season')
+    pd.testing.assert_frame_equal(compact_df.astype(str), loose_df.drop(columns=list(schema.name_columns)).astype(str))
+    loose_mb = loose_df.memory_usage(deep=True).sum() / 2**20
+    compact_mb = schema.get_memory_report(compact_df).loc['total', 'mb']
+    names_mb = player_names.memory_usage(deep=True).sum() / 2**20
+    print(f"{'schema':<28} loose {loose_mb:8.1f}MB   compact {compact_mb:8.1f}MB + names {names_mb:.1f}MB   {loose_mb/(compact_mb + names_mb):6.1f}x smaller   same values")
+    print(schema.get_memory_report(compact_df).head(10).to_string(float_format="{:.2f}".format))
+
+if __name__ == "__main__":
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-g", "--games", type=int, default=250, help="number of synthetic games")
+    parser.add_argument("-r", "--repeat", type=int, default=1)
+    parser.add_argument("-b", "--benchmarks", nargs="+", default=['raw', 'features'], choices=['raw', 'features', 'rates', 'online', 'schema'])
+    parser.add_argument("-s", "--seasons", type=int, nargs="+", default=[1], help="numbers of stacked seasons for feature benchmarks")
+    args = parser.parse_args()
+
+    # Build synthetic season and benchmark
+    season_data = synthetic.get_synthetic_season_data(args.games)
+    if 'raw' in args.benchmarks:
+        benchmark_create_raw_data_frame(season_data, repeat=args.repeat)
+    if 'features' in args.benchmarks:
+        raw_df = convert_to_dataframe.create_raw_data_frame(season_data)
+        benchmark_create_features(raw_df, seasons=args.seasons, repeat=args.repeat)
+    if 'rates' in args.benchmarks:
+        benchmark_add_pitcher_pitch_rates(convert_to_dataframe.create_raw_data_frame(season_data), seasons=args.seasons, repeat=args.repeat)
+    if 'online' in args.benchmarks:
+        benchmark_online_features(convert_to_dataframe.create_raw_data_frame(season_data))
+    if 'schema' in args.benchmarks:
+        benchmark_schema(convert_to_dataframe.create_raw_data_frame(season_data))
@@ -1,24 +1,71 @@
 import pandas as pd
-from dataclasses import asdict
+import numpy as np
+from dataclasses import fields
+from pull_from_api import AtBat, get_at_bat_values, iter_pitches
+
+at_bat_fields = [field for field in fields(AtBat) if field.name != 'pitches']
+
+class RawColumns:
+    """Growable column buffers for the raw dataframe, filled one at bat at a time"""
+    def __init__(self):
+        self.game_ids, self.at_bat_idxs, self.n_pitches = list(), list(), list()
+        self.at_bat_columns = {field.name: list() for field in at_bat_fields} # one value per at bat
+        self.balls, self.strikes, self.pitch_types = list(), list(), list() # one value per pitch
+        self.n_rows = 0
+
+    def add_at_bat(self, game_id, at_bat_idx, at_bat_values, pitches):
+        """Add an at bat's values (keyed by AtBat field) and its (pitch_type, count) pitches"""
+        n_pitches = 0
+        for pitch_type, count in pitches:
+            self.balls.append(count['balls'])
+            self.strikes.append(count['strikes'])
+            self.pitch_types.append(pitch_type)
+            n_pitches += 1
+        if n_pitches == 0:
+            return
+        for field in at_bat_fields:
+            self.at_bat_columns[field.name].append(at_bat_values[field.name])
+        self.game_ids.append(game_id)
+        self.at_bat_idxs.append(at_bat_idx)
+        self.n_pitches.append(n_pitches)
+        self.n_rows += n_pitches
+
+    def to_frame(self):
+        """Build the raw dataframe, repeating at bat-level values once per pitch"""
+        n_pitches = self.n_pitches
+        df = pd.DataFrame({'game_id': np.repeat(np.array(self.game_ids, dtype=np.int64), n_pitches)})
+        for field in at_bat_fields:
+            dtype = field.type if field.type in (int, bool) else object
+            df[field.name] = np.repeat(np.array(self.at_bat_columns[field.name], dtype=dtype), n_pitches)
+        df['balls'] = np.array(self.balls, dtype=np.int64)
+        df['strikes'] = np.array(self.strikes, dtype=np.int64)
+        df['pitch_type'] = pd.Categorical(self.pitch_types)
+        df['at_bat'] = np.repeat(np.array(self.at_bat_idxs, dtype=np.int64), n_pitches)
+        df = df.loc[(df['balls'] <= 3) & (df['strikes'] <= 2)] # drop a few entry errors
+        df.reset_index(drop=True, inplace=True)
+        return df
 
 ## Create raw dataframe from api values
 def create_raw_data_frame(season_data):
     """Convert values returned from api into dataframe"""
-    at_bat_dfs = list()
+    columns = RawColumns()
     for game_id, at_bats in season_data.items():
         for at_bat_idx, at_bat in at_bats.items():
-            pitches = at_bat.pitches
-            if len(pitches) == 0:
-                continue
-            at_bat_dict = asdict(at_bat)
-            at_bat_level_info = pd.Series({'game_id': game_id} | at_bat_dict).drop('pitches')
-            at_bat_df = pd.concat([at_bat_level_info]*len(pitches), axis=1).T
-            at_bat_df['balls'] = [pitch.count['balls'] for pitch in pitches]
-            at_bat_df['strikes'] = [pitch.count['strikes'] for pitch in pitches]
-            at_bat_df['pitch_type'] = [pitch.pitch_type for pitch in pitches]        
-            at_bat_df['at_bat'] = at_bat_idx
-            at_bat_dfs.append(at_bat_df)
-    season_df = pd.concat(at_bat_dfs)
-    season_df = season_df.loc[(season_df['balls'] <= 3) & (season_df['strikes'] <= 2)] # drop a few entry errors
-    season_df.reset_index(drop=True, inplace=True)
+            at_bat_values = {field.name: getattr(at_bat, field.name) for field in at_bat_fields}
+            pitches = ((pitch.pitch_type, pitch.count) for pitch in at_bat.pitches)
+            columns.add_at_bat(game_id, at_bat_idx, at_bat_values, pitches)
+    season_df = columns.to_frame()
     return season_df
+
+## Stream raw dataframes straight from api json
+def iter_raw_data_frames(play_by_plays, batch_size=100_000):
+    """Yield a raw dataframe every batch_size or so pitches, ending on game boundaries"""
+    columns = RawColumns()
+    for game_id, play_by_play in play_by_plays:
+        for at_bat in play_by_play['allPlays']:
+            columns.add_at_bat(game_id, at_bat['atBatIndex'], get_at_bat_values(at_bat), iter_pitches(at_bat))
+        if columns.n_rows >= batch_size:
+            yield columns.to_frame()
+            columns = RawColumns()
+    if columns.n_rows > 0:
+        yield columns.to_frame()
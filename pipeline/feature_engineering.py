@@ -1,32 +1,104 @@
 import pandas as pd
 import numpy as np
 
+pitch_types = ['changeup', 'curveball', 'cutter', 'fastball', 'knuckle_curve', 'other', 'sinker', 'slider', 'splitter'] # cleaned pitch types, sorted as get_dummies orders them
+common_pitches = ['Four-Seam Fastball', 'Fastball', 'Slider', 'Sinker', 'Changeup', 'Curveball', 'Cutter', 'Knuckle Curve', 'Splitter']
+
 def create_features(season_df):
     """Main function—clean up and augment dataframe"""
     season_df = clean_pitch_type(season_df)
     season_df = get_count(season_df)
-    season_df = get_last_pitch_type(season_df)
-    season_df = get_previous_balls_and_strikes(season_df)
-    season_df = get_pitch_count(season_df)
-    season_df = get_inning_pitch_count(season_df)
-    season_df = get_at_bat_pitch_count(season_df)
-    season_df = get_at_bat_pitches(season_df)
+    season_df = get_sequence_features(season_df)
     return season_df 
 
+## Fused sequence features
+def get_sequence_features(df):
+    """Add lags, pitch counts and at bat pitch type counts in one pass"""
+    n = len(df)
+    game_id, at_bat_index = df['game_id'].to_numpy(), df['at_bat_index'].to_numpy()
+    batter_id, pitch_type = df['batter_id'].to_numpy(), df['pitch_type'].to_numpy()
+    balls, strikes = df['balls'].to_numpy(), df['strikes'].to_numpy()
+    features = dict()
+
+    # Lagged pitch types ("none" unless the same batter faced the lagged pitch)
+    for i in (1, 2):
+        lag = np.full(n, "none", dtype=object)
+        same_batter = batter_id[i:] == batter_id[:-i]
+        lag[i:][same_batter] = pitch_type[:-i][same_batter]
+        features[f'pitch_type_lag_{i}'] = lag
+
+    # Whether each of the last 3 pitches in the at bat was a ball/strike
+    for i in range(1, 4):
+        same_at_bat = at_bat_index[i:] == at_bat_index[:-i]
+        for name, values in (('ball', balls), ('strike', strikes)):
+            lag = np.zeros(n, dtype=bool)
+            lag[i:] = (values[i:] > values[:-i]) & same_at_bat
+            features[f'lag_{i}_{name}'] = lag
+
+    # Game and inning pitch counts from one stable sort by game, pitcher, inning
+    order = np.lexsort((df['inning'].to_numpy(), df['pitcher_id'].to_numpy(), game_id))
+    new_pitcher_game = get_group_starts(game_id[order], df['pitcher_id'].to_numpy()[order])
+    new_pitcher_inning = new_pitcher_game | get_group_starts(df['inning'].to_numpy()[order])
+    for name, group_starts in (('pitch_count', new_pitcher_game), ('inning_pitch_count', new_pitcher_inning)):
+        counts = np.empty(n, dtype=np.int64)
+        counts[order] = get_group_positions(group_starts)
+        features[name] = counts
+
+    # At bat pitch count and running count of each pitch type before this pitch
+    new_at_bat = get_group_starts(game_id, at_bat_index)
+    features['ab_pitch_count'] = get_group_positions(new_at_bat)
+    at_bat_start = np.maximum.accumulate(np.where(new_at_bat, np.arange(n), 0))
+    continues_at_bat = np.zeros(n, dtype=bool)
+    continues_at_bat[1:] = at_bat_index[1:] == at_bat_index[:-1]
+    pitch_type_codes = pd.Categorical(pitch_type, categories=pitch_types).codes
+    for code, type_name in enumerate(pitch_types):
+        is_type = pitch_type_codes == code
+        type_counts = np.cumsum(is_type, dtype=np.int64)
+        type_counts -= (type_counts - is_type)[at_bat_start] # running count within at bat
+        prior_counts = np.zeros(n, dtype=np.uint8)
+        prior_counts[1:] = np.where(continues_at_bat[1:], type_counts[:-1], 0)
+        features[f'ab_{type_name}_count'] = prior_counts
+
+    df = pd.concat([df, pd.DataFrame(features, index=df.index)], axis=1)
+    return df
+
+def get_group_starts(*keys):
+    """Helper: mark rows where any key differs from the previous row"""
+    starts = np.zeros(len(keys[0]), dtype=bool)
+    starts[0:1] = True
+    for key in keys:
+        starts[1:] |= key[1:] != key[:-1]
+    return starts
+
+def get_group_positions(group_starts):
+    """Helper: position of each row within its group (like groupby().cumcount() on grouped rows)"""
+    positions = np.arange(len(group_starts))
+    return positions - np.maximum.accumulate(np.where(group_starts, positions, 0))
+
+## Single-feature versions
+
 def clean_pitch_type(df):
     """Clean up/rename values in pitch type variable"""
     df['raw_pitch_type'] = df['pitch_type']
-    common_pitches = ['Four-Seam Fastball', 'Fastball', 'Slider', 'Sinker', 'Changeup', 'Curveball', 'Cutter', 'Knuckle Curve', 'Splitter']
+    df['pitch_type'] = df['pitch_type'].astype(object) # categorical can't take the new values below
     df.loc[~df['pitch_type'].isin(common_pitches), 'pitch_type'] = "Other"
     df['pitch_type'].replace("Four-Seam Fastball", "Fastball", inplace=True)
     df['pitch_type'].replace("Knuckle Curve", "Knuckle_Curve", inplace=True)
     df['pitch_type'] = df['pitch_type'].str.lower()
     return df
 
+def get_clean_pitch_type(raw_pitch_type):
+    """Clean up/rename a single pitch type value, as clean_pitch_type does for a column"""
+    if raw_pitch_type not in common_pitches:
+        return "other"
+    return raw_pitch_type.replace("Four-Seam Fastball", "Fastball").replace(" ", "_").lower()
+
 def get_count(df):
     """Add column for count to dataframe"""
-    df['count'] = ("(" + df['balls'].astype(str) + "," + df['strikes'].astype(str) + ")")
-    return df 
+    balls, strikes = df['balls'].to_numpy(), df['strikes'].to_numpy()
+    labels = np.array([f"({b},{s})" for b in range(4) for s in range(3)], dtype=object)
+    df['count'] = labels[balls*3 + strikes] # create_raw_data_frame keeps balls <= 3, strikes <= 2
+    return df
 
 def get_pitching_lead(df):
     """Return lead of pitching team"""
@@ -68,7 +140,8 @@ def get_at_bat_pitch_count(df):
 
 def get_at_bat_pitches(df):
     """Add number of pitches of each type so far in at bat"""
-    pitch_type_dummies = pd.get_dummies(df['pitch_type'], prefix="ab") # get pitch types as dummies
+    pitch_type_dummies = pd.get_dummies(pd.Categorical(df['pitch_type'], categories=pitch_types), prefix="ab") # get pitch types as dummies (every type, even if missing from df)
+    pitch_type_dummies.index = df.index
     pitch_type_dummies = pitch_type_dummies.join(df[['game_id', 'at_bat_index']]) # add in at bat index
     pitch_type_counts = pitch_type_dummies.groupby(['game_id', 'at_bat_index']).cumsum() # get running count of pitch types
     count_columns = [c + "_count" for c in pitch_type_counts.columns]
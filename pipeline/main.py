@@ -1,39 +1,103 @@
-import pull_from_api, convert_to_dataframe, feature_engineering, add_pitch_rates, pitcher_level_info
+import pull_from_api, convert_to_dataframe, feature_engineering, add_pitch_rates, pitcher_level_info, schema
 import os
 import argparse
+import pandas as pd
 
 ## Main
-def main(season):
-    """Collect, clean, and augment season data"""
-    season_data = pull_from_api.get_season_data(season) # pull season data from api
-    season_df = convert_to_dataframe.create_raw_data_frame(season_data) # convert into dataframe 
-    season_df = feature_engineering.create_features(season_df) # add created features
-    season_df = add_pitch_rates.add_pitcher_pitch_rates(season_df) # add pitcher's frequency of pitch-types
-    return season_df 
+def main(season, workers=1, max_per_second=None, cache_dir=None, refresh=False, batch_size=100_000, prior_counts=None, prior_season_pitches=None, skip_game_ids=()):
+    """Collect, clean, and augment season data, returning it with the lookup table of player names"""
+    play_by_plays = pull_from_api.iter_season_play_by_play(season, workers, max_per_second, cache_dir, refresh, skip_game_ids=skip_game_ids) # stream games from api (or raw cache)
+    raw_batches = convert_to_dataframe.iter_raw_data_frames(play_by_plays, batch_size) # parse into dataframes of ~batch_size pitches
+    feature_batches, player_names = list(), list()
+    for raw_batch in raw_batches:
+        raw_batch, batch_names = schema.split_player_names(schema.enforce(raw_batch, 'raw')) # names go to a lookup table, not every pitch
+        feature_batches.append(schema.enforce(feature_engineering.create_features(raw_batch), 'features')) # add created features
+        player_names.append(batch_names)
+    season_df = schema.enforce(pd.concat(feature_batches, ignore_index=True), 'features') # batches' open categories (e.g. start_time) differ, so recombine
+    season_df = add_pitch_rates.add_pitcher_pitch_rates(season_df, prior_counts=prior_counts, prior_season_pitches=prior_season_pitches) # add pitcher's frequency of pitch-types
+    season_df = schema.enforce(season_df, 'season')
+    return season_df, schema.combine_player_names(player_names)
+
+## Append new games
+def append_games(season, season_path, counts_path, names_path, store_format='parquet', carried_counts=None, **options):
+    """Build the games missing from a season's store and append them"""
+    season_df = pd.read_parquet(season_path) if store_format == 'parquet' else pd.read_csv(season_path)
+    built_game_ids = set(season_df['game_id'].unique())
+    if not set(pull_from_api.get_game_ids(season)) - built_game_ids:
+        return 0
+    season_counts = pd.read_csv(counts_path, index_col='pitcher_id') # the season's own pitches
+    prior_counts = season_counts.add(carried_counts, fill_value=0).astype('int64') if carried_counts is not None else season_counts
+    new_df, new_names = main(season, prior_counts=prior_counts, prior_season_pitches=season_df.groupby('pitcher_id').size(), skip_game_ids=built_game_ids, **options)
+    season_df = schema.enforce(pd.concat([season_df, new_df], ignore_index=True), 'season')
+    write_season(season_df, season_path + ".tmp", store_format)
+    os.replace(season_path + ".tmp", season_path)
+    schema.combine_player_names([pd.read_csv(names_path, index_col='player_id'), new_names]).to_csv(names_path)
+    add_pitch_rates.get_pitcher_pitch_counts(new_df, season_counts).to_csv(counts_path)
+    return len(new_df)
+
+## Write out
+def write_season(season_df, season_path, store_format='parquet'):
+    """Write season dataframe as parquet (keeping its schema's dtypes) or csv"""
+    if store_format == 'csv':
+        season_df.to_csv(season_path, index=False)
+        return
+    season_df.to_parquet(season_path, index=False)
 
 if __name__ == "__main__":    
     # Get arguments
     parser = argparse.ArgumentParser()
     parser.add_argument("-s", "--season", type=str)
     parser.add_argument("-o", "--overwrite", action='store_true')
+    parser.add_argument("-a", "--append", action='store_true', help="build only games missing from the season store and append them")
     parser.add_argument("-p", "--pitcher_info", action='store_true')
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of games to fetch concurrently")
+    parser.add_argument("-r", "--max_per_second", type=float, default=None, help="cap on api requests per second")
+    parser.add_argument("-b", "--batch_size", type=int, default=100_000, help="pitches parsed per batch")
+    parser.add_argument("-f", "--format", choices=['parquet', 'csv'], default='parquet', help="season store format (csv for export)")
+    parser.add_argument("-c", "--carry_rates", action='store_true', help="start pitchers' rates from last season's pitch counts (with --append, give it if the season was built with it)")
+    parser.add_argument("--no_cache", action='store_true', help="don't read or write the raw play-by-play cache")
+    parser.add_argument("--refresh_cache", action='store_true', help="re-download games already in the raw play-by-play cache")
+    parser.add_argument("-m", "--memory_report", action='store_true', help="print each column's dtype and memory")
     args = parser.parse_args()
     season = args.season
     pitcher_info = args.pitcher_info
     overwrite = args.overwrite
+    workers = args.workers
+    max_per_second = args.max_per_second
+    use_cache = not args.no_cache
+    refresh_cache = args.refresh_cache
+    batch_size = args.batch_size
+    store_format = args.format
+    carry_rates = args.carry_rates
 
     # Get paths
     pipeline_dir = os.path.dirname(__file__)
     data_dir = os.path.join(os.path.dirname(pipeline_dir), "data")
-    season_path = os.path.join(data_dir, f"{season}.csv")
+    season_path = os.path.join(data_dir, f"{season}.{store_format}")
+    cache_dir = os.path.join(data_dir, "raw") if use_cache else None
+    counts_path = os.path.join(data_dir, f"pitch_counts_{season}.csv")
+    names_path = os.path.join(data_dir, f"players_{season}.csv")
+    prior_counts_path = os.path.join(data_dir, f"pitch_counts_{int(season)-1}.csv")
     if not os.path.exists(data_dir):
         os.mkdir(data_dir)
     
     # Get data
-    if overwrite or not os.path.exists(season_path):
-        season_df = main(season)
-        season_df.to_csv(season_path, index=False)
+    prior_counts = None
+    if carry_rates and (overwrite or args.append or not os.path.exists(season_path)):
+        if not os.path.exists(prior_counts_path):
+            raise Exception(f"No pitch counts for {int(season)-1}. Build that season first with `python pipeline/main.py -s {int(season)-1}`")
+        prior_counts = pd.read_csv(prior_counts_path, index_col='pitcher_id')
+    if args.append and not overwrite and os.path.exists(season_path):
+        n_appended = append_games(season, season_path, counts_path, names_path, store_format, prior_counts, workers=workers, max_per_second=max_per_second, cache_dir=cache_dir, refresh=refresh_cache, batch_size=batch_size)
+        print(f"Appended {n_appended} pitches to {season_path}")
+    elif overwrite or not os.path.exists(season_path):
+        season_df, player_names = main(season, workers=workers, max_per_second=max_per_second, cache_dir=cache_dir, refresh=refresh_cache, batch_size=batch_size, prior_counts=prior_counts)
+        write_season(season_df, season_path, store_format)
+        player_names.to_csv(names_path)
+        add_pitch_rates.get_pitcher_pitch_counts(season_df).to_csv(counts_path) # the season's own pitches
+        if args.memory_report:
+            print(schema.get_memory_report(season_df).to_string(float_format="{:.2f}".format))
         if pitcher_info:
-            pitcher_info = pitcher_level_info.get_pitcher_level_info(season_df)
+            pitcher_info = pitcher_level_info.get_pitcher_level_info(season_df, player_names)
             pitcher_info.to_csv(os.path.join(data_dir, f"pitcher_level_info_{season}.csv"), index=True)
             
\ No newline at end of file
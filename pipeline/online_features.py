@@ -0,0 +1,133 @@
+import numpy as np
+from collections import defaultdict, deque
+from feature_engineering import pitch_types, get_clean_pitch_type
+
+## Feature layout (mirrors model/fit.get_features with every dummy level present)
+model_pitch_types = ['fastball', 'curveball', 'sinker', 'cutter', 'changeup', 'slider', 'splitter', 'knuckle_curve', 'other']
+count_levels = [f"({balls},{strikes})" for balls in range(4) for strikes in range(3)]
+lag_levels = sorted(pitch_types + ['none'])
+
+def get_feature_names(simple=False):
+    """List features in the order model/fit.get_features returns them"""
+    features = ['inning', 'top', 'outs', 'runner_1', 'runner_2', 'runner_3', 'home_score', 'away_score']
+    features += ['pitch_count', 'inning_pitch_count', 'ab_pitch_count', 'pitcher_lefty', 'batter_lefty']
+    features += [pitch_type + "_rate" for pitch_type in model_pitch_types]
+    features += [f"count_{count}" for count in count_levels]
+    if not simple:
+        features += [f"lag_1_{level}" for level in lag_levels] + [f"lag_2_{level}" for level in lag_levels]
+        features += [f"ab_{pitch_type}_count" for pitch_type in model_pitch_types]
+    return features
+
+## Per-game state
+class GameState:
+    """Running counters for one game"""
+    def __init__(self):
+        self.recent = deque(maxlen=3) # (batter_id, at_bat_index, balls, strikes, pitch_type) of the last 3 pitches
+        self.pitcher_counts = defaultdict(int) # pitcher_id -> pitches thrown
+        self.inning_counts = defaultdict(int) # (inning, pitcher_id) -> pitches thrown
+        self.at_bat_counts = defaultdict(int) # at_bat_index -> pitches thrown
+        self.at_bat_type_counts = dict.fromkeys(model_pitch_types, 0) # pitch types thrown so far in current at bat
+        self.pending = None # (pitcher_id, inning, at_bat_index, batter_id, balls, strikes) of the pitch featurized but not yet thrown
+
+## Accumulator
+class OnlineFeatures:
+    """Pitch-by-pitch feature accumulator matching the batch pipeline"""
+    def __init__(self, feature_names=None, simple=False, min_pitches=100):
+        self.feature_names = feature_names if feature_names is not None else get_feature_names(simple)
+        self.positions = {name: i for i, name in enumerate(self.feature_names)}
+        self.min_pitches = min_pitches
+        self.games = dict() # game_id -> GameState
+        self.last_game_id = None # game of the last features() call
+        self.pitcher_type_counts = defaultdict(lambda: dict.fromkeys(model_pitch_types, 0)) # pitcher_id -> season pitch type counts
+        self.pitcher_totals = defaultdict(int) # pitcher_id -> season pitches
+
+    def features(self, pitch_state):
+        """Feature vector of the next pitch from the game state before it"""
+        game = self.games.get(pitch_state['game_id'])
+        if game is None:
+            game = self.games[pitch_state['game_id']] = GameState()
+        pitcher_id, inning, at_bat_index = pitch_state['pitcher_id'], pitch_state['inning'], pitch_state['at_bat_index']
+        balls, strikes = pitch_state['balls'], pitch_state['strikes']
+        values = {name: pitch_state[name] for name in ('inning', 'top', 'outs', 'runner_1', 'runner_2', 'runner_3', 'home_score', 'away_score', 'pitcher_lefty', 'batter_lefty')}
+        dummies = [f"count_({balls},{strikes})"]
+
+        # Lags (recent[-i] is the ith previous pitch in the game)
+        recent = game.recent
+        for i in (1, 2):
+            same_batter = len(recent) >= i and recent[-i][0] == pitch_state['batter_id']
+            dummies.append(f"lag_{i}_{recent[-i][4] if same_batter else 'none'}")
+        for i in range(1, 4):
+            same_at_bat = len(recent) >= i and recent[-i][1] == at_bat_index
+            values[f'lag_{i}_ball'] = same_at_bat and balls > recent[-i][2]
+            values[f'lag_{i}_strike'] = same_at_bat and strikes > recent[-i][3]
+
+        # Pitch counts before this pitch
+        values['pitch_count'] = game.pitcher_counts[pitcher_id]
+        values['inning_pitch_count'] = game.inning_counts[(inning, pitcher_id)]
+        values['ab_pitch_count'] = game.at_bat_counts[at_bat_index]
+        if not recent or recent[-1][1] != at_bat_index:
+            game.at_bat_type_counts = dict.fromkeys(model_pitch_types, 0)
+        for type_name, count in game.at_bat_type_counts.items():
+            values[f"ab_{type_name}_count"] = count
+
+        # Pitcher's season rates from previous pitches
+        total = self.pitcher_totals[pitcher_id]
+        for type_name, count in self.pitcher_type_counts[pitcher_id].items():
+            values[f"{type_name}_rate"] = np.float32(count / total) if total >= max(self.min_pitches, 1) else np.nan # float32, as in add_pitch_rates
+
+        game.pending = (pitcher_id, inning, at_bat_index, pitch_state['batter_id'], balls, strikes)
+        self.last_game_id = pitch_state['game_id']
+        return self.to_vector(values, dummies)
+
+    def update(self, pitch_type, game_id=None):
+        """Record the observed type of the pitch last featurized in game_id (by default, the last game featurized)"""
+        game = self.games[game_id if game_id is not None else self.last_game_id]
+        if game.pending is None:
+            raise ValueError("update() needs a features() call for the pitch first")
+        pitcher_id, inning, at_bat_index, batter_id, balls, strikes = game.pending
+        pitch_type = get_clean_pitch_type(pitch_type)
+        self.pitcher_type_counts[pitcher_id][pitch_type] += 1
+        self.pitcher_totals[pitcher_id] += 1
+        game.pitcher_counts[pitcher_id] += 1
+        game.inning_counts[(inning, pitcher_id)] += 1
+        game.at_bat_counts[at_bat_index] += 1
+        game.at_bat_type_counts[pitch_type] += 1
+        game.recent.append((batter_id, at_bat_index, balls, strikes, pitch_type))
+        game.pending = None
+
+    def ingest(self, pitch):
+        """Feature vector of an already thrown pitch (a row with its pitch_type), then record it"""
+        vector = self.features(pitch)
+        self.update(pitch['pitch_type'], pitch['game_id'])
+        return vector
+
+    def to_vector(self, values, dummies):
+        """Helper: lay out feature values and active dummy columns in feature order"""
+        vector = np.zeros(len(self.feature_names))
+        for name, value in values.items():
+            position = self.positions.get(name)
+            if position is not None:
+                vector[position] = value
+        for name in dummies:
+            position = self.positions.get(name)
+            if position is not None:
+                vector[position] = 1
+        return vector
+
+    def load_counts(self, counts):
+        """Add pitchers' earlier pitch type counts"""
+        for pitcher_id, row in counts.iterrows():
+            for pitch_type, count in row.items():
+                self.pitcher_type_counts[pitcher_id][pitch_type] += int(count)
+                self.pitcher_totals[pitcher_id] += int(count)
+
+    def end_game(self, game_id):
+        """Drop a finished game's counters"""
+        self.games.pop(game_id, None)
+
+## Replay
+def replay_season(raw_df, feature_names=None, simple=False, min_pitches=100):
+    """Feed a raw season dataframe through OnlineFeatures row by row, returning the stacked feature vectors"""
+    online_features = OnlineFeatures(feature_names, simple=simple, min_pitches=min_pitches)
+    vectors = [online_features.ingest(pitch) for pitch in raw_df.to_dict('records')]
+    return np.vstack(vectors)
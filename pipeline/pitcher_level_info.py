@@ -1,10 +1,12 @@
 import pandas as pd
 import numpy as np
 
-def get_pitcher_level_info(df, min_pitches=100):
-    """Store pitcher's rates and handedness for streamlit app"""
-    df_last = df.groupby('pitcher_name').last()
-    df_last = df_last.loc[df_last['nth_season_pitch'] >= min_pitches] # restrict to pitchers with >= min_pitches
+def get_pitcher_level_info(df, player_names, min_pitches=100):
+    """Store pitcher's rates and handedness for streamlit app (player_names is main's player_id -> name lookup table)"""
+    df_last = df.groupby('pitcher_id').last()
+    df_last = df_last.loc[df_last['nth_season_pitch'] > min_pitches] # restrict to pitchers whose last pitch had rates (from >= min_pitches previous pitches)
+    df_last.index = pd.Index(player_names.loc[df_last.index, 'name'], name='pitcher_name')
+    df_last = df_last.sort_index() # by name, as before names moved out of the season frame
     pitcher_level_info = df_last[
         ['pitcher_lefty', 'fastball_rate', 'sinker_rate', 'slider_rate', 'changeup_rate', 'knuckle_curve_rate', 'curveball_rate', 'cutter_rate', 'splitter_rate', 'other_rate']
     ]
@@ -0,0 +1,159 @@
+import os
+import csv
+import json
+import argparse
+import numpy as np
+from collections import defaultdict
+
+pitch_types = ['fastball', 'curveball', 'sinker', 'cutter', 'changeup', 'slider', 'splitter', 'knuckle_curve', 'other']
+rate_columns = [pitch_type + "_rate" for pitch_type in pitch_types]
+profile_columns = ['game_id', 'pitcher_id', 'pitcher_lefty', 'start_time', 'nth_season_pitch', 'pitch_type']
+
+## Build
+def get_game_snapshots(season_df, prior_counts=None, min_pitches=100):
+    """Helper: each pitcher's season pitches and rates after each of their games"""
+    import pandas as pd
+    season_df = season_df[profile_columns].astype({'start_time': str, 'pitch_type': str}) # categorical in season stores, and min needs strings
+    season_df = season_df.assign(start_time=season_df.groupby('game_id')['start_time'].transform('min'))
+    keys = [season_df['pitcher_id'], season_df['game_id']]
+    snapshots = season_df.groupby(keys, sort=False).agg(pitcher_lefty=('pitcher_lefty', 'last'), start_time=('start_time', 'first'), nth_season_pitch=('nth_season_pitch', 'max'))
+    game_counts = pd.crosstab(keys, season_df['pitch_type']).reindex(index=snapshots.index, columns=pitch_types, fill_value=0)
+    counts = game_counts.groupby(level='pitcher_id', sort=False).cumsum().to_numpy(dtype=np.int64) # through each game, in store order as the rates are
+    if prior_counts is not None:
+        counts += prior_counts.reindex(index=snapshots.index.get_level_values('pitcher_id'), columns=pitch_types, fill_value=0).to_numpy(dtype=np.int64)
+    totals = counts.sum(axis=1, keepdims=True)
+    rates = (counts / np.maximum(totals, 1)).astype(np.float32)
+    rates[totals[:, 0] < max(min_pitches, 1)] = np.nan
+    snapshots[rate_columns] = rates
+    return snapshots.reset_index()
+
+# Profile store: pitcher_ids.npy (sorted, int64), lefty.npy (np.packbits bitfield), offsets.npy (pitcher i's
+# snapshots are rows offsets[i]:offsets[i+1]), times.npy (game times, datetime64[s]), totals.npy (season pitches, int32),
+## rates.npy (through each game, NaN under min_pitches, float32), names.json (name -> IDs)
+def build_pitcher_profiles(season_dfs, profile_dir, player_names, prior_counts=None, min_pitches=100):
+    """Write each pitcher's rates after every game they pitched as memory-mappable arrays"""
+    import pandas as pd # only needed to build, so lookups don't pay for the import
+    prior_counts = prior_counts or [None] * len(season_dfs)
+    snapshots = pd.concat([get_game_snapshots(season_df, season_prior_counts, min_pitches) for season_df, season_prior_counts in zip(season_dfs, prior_counts)], ignore_index=True)
+    snapshots['time'] = snapshots['start_time'].str.slice(0, 19).astype('datetime64[s]')
+    snapshots = snapshots.sort_values(['pitcher_id', 'time'], kind='stable').reset_index(drop=True)
+
+    pitcher_ids, first_rows = np.unique(snapshots['pitcher_id'].to_numpy(), return_index=True)
+    offsets = np.append(first_rows, len(snapshots)).astype(np.int64)
+    latest = snapshots.iloc[offsets[1:] - 1]
+    os.makedirs(profile_dir, exist_ok=True)
+    np.save(os.path.join(profile_dir, "pitcher_ids.npy"), pitcher_ids.astype(np.int64))
+    np.save(os.path.join(profile_dir, "lefty.npy"), np.packbits(latest['pitcher_lefty'].to_numpy(dtype=bool)))
+    np.save(os.path.join(profile_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(profile_dir, "times.npy"), snapshots['time'].to_numpy().astype('datetime64[s]'))
+    np.save(os.path.join(profile_dir, "totals.npy"), snapshots['nth_season_pitch'].to_numpy(dtype=np.int32))
+    np.save(os.path.join(profile_dir, "rates.npy"), snapshots[rate_columns].to_numpy(dtype=np.float32))
+    name_to_ids = defaultdict(list)
+    for name, pitcher_id in zip(player_names.loc[pitcher_ids, 'name'], pitcher_ids.astype(int).tolist()):
+        name_to_ids[name].append(pitcher_id)
+    with open(os.path.join(profile_dir, "names.json"), "w") as f:
+        json.dump(name_to_ids, f)
+
+def get_labels(name_to_ids):
+    """Helper: a unique label per pitcher ID, the name itself unless other pitchers share it (then "name (ID)")"""
+    return {name if len(pitcher_ids) == 1 else f"{name} ({pitcher_id})": pitcher_id for name, pitcher_ids in name_to_ids.items() for pitcher_id in pitcher_ids}
+
+## Lookup
+class PitcherProfiles:
+    """Pitcher lookups from a build_pitcher_profiles directory, without pandas"""
+    def __init__(self, profile_dir):
+        load = lambda name: np.load(os.path.join(profile_dir, f"{name}.npy"), mmap_mode='r')
+        self.pitcher_ids = load("pitcher_ids")
+        self.lefty = np.unpackbits(load("lefty"), count=len(self.pitcher_ids)).astype(bool)
+        self.offsets = load("offsets")
+        self.times = load("times")
+        self.totals = load("totals")
+        self.rates = load("rates")
+        with open(os.path.join(profile_dir, "names.json"), "r") as f:
+            self.name_to_id = get_labels(json.load(f)) # label -> ID
+
+    def get_index(self, pitcher_id):
+        """Helper: row of pitcher_id in pitcher_ids"""
+        i = np.searchsorted(self.pitcher_ids, pitcher_id)
+        if i == len(self.pitcher_ids) or self.pitcher_ids[i] != pitcher_id:
+            raise KeyError(f"No profile for pitcher {pitcher_id}")
+        return i
+
+    def get_id(self, pitcher_name):
+        """Pitcher ID from name (or "name (ID)" label, for names pitchers share)"""
+        return self.name_to_id[pitcher_name]
+
+    def is_lefty(self, pitcher_id):
+        """Whether the pitcher throws left-handed"""
+        return bool(self.lefty[self.get_index(pitcher_id)])
+
+    def get_rates(self, pitcher_id, as_of=None):
+        """Pitcher's pitch type rates before as_of, or over all their games"""
+        i = self.get_index(pitcher_id)
+        start, end = self.offsets[i], self.offsets[i+1]
+        if as_of is not None:
+            end = start + np.searchsorted(self.times[start:end], np.datetime64(as_of, 's'))
+            if end == start:
+                return np.full(len(pitch_types), np.nan, dtype=np.float32)
+        return np.array(self.rates[end-1])
+
+    def get_qualified_names(self, as_of=None):
+        """Names (labels, for names pitchers share) of pitchers with rates (enough pitches) as of as_of, sorted"""
+        return sorted(name for name, pitcher_id in self.name_to_id.items() if not np.isnan(self.get_rates(pitcher_id, as_of)[0]))
+
+class PitcherLevelInfo:
+    """PitcherProfiles' lookups from a pitcher_level_info csv, keyed by name"""
+    def __init__(self, csv_path):
+        with open(csv_path, newline="") as f:
+            rows = {row['pitcher_name']: row for row in csv.DictReader(f)}
+        self.lefty = {name: row['pitcher_lefty'] == "True" for name, row in rows.items()}
+        self.rates = {name: np.array([row[column] for column in rate_columns], dtype=np.float32) for name, row in rows.items()}
+
+    def get_id(self, pitcher_name):
+        """The name itself"""
+        if pitcher_name not in self.rates:
+            raise KeyError(f"No pitcher named {pitcher_name}")
+        return pitcher_name
+
+    def is_lefty(self, pitcher_id):
+        """Whether the pitcher throws left-handed"""
+        return self.lefty[pitcher_id]
+
+    def get_rates(self, pitcher_id, as_of=None):
+        """Pitcher's pitch type rates (pitch_types order) at the end of the csv's season"""
+        if as_of is not None:
+            raise ValueError("pitcher_level_info only has each pitcher's latest rates; build a profile store for rates as of a date")
+        return self.rates[pitcher_id].copy()
+
+    def get_qualified_names(self, as_of=None):
+        """Names of every pitcher in the csv (it only lists pitchers with enough pitches), sorted"""
+        if as_of is not None:
+            raise ValueError("pitcher_level_info only has each pitcher's latest rates; build a profile store for rates as of a date")
+        return sorted(self.rates)
+
+if __name__ == "__main__":
+    import pandas as pd
+    import schema
+
+    # Get arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--first_season", type=int)
+    parser.add_argument("-l", "--last_season", type=int)
+    parser.add_argument("-c", "--carry_rates", action='store_true', help="give if the seasons were built with carried rates")
+    args = parser.parse_args()
+
+    # Build from season stores
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+    season_dfs, player_names, prior_counts = list(), list(), list()
+    for season in range(args.first_season, args.last_season + 1):
+        prior_counts_path = os.path.join(data_dir, f"pitch_counts_{season-1}.csv")
+        if args.carry_rates and not os.path.exists(prior_counts_path):
+            raise Exception(f"No pitch counts for {season-1}. Build that season first")
+        prior_counts.append(pd.read_csv(prior_counts_path, index_col='pitcher_id') if args.carry_rates else None)
+        player_names.append(pd.read_csv(os.path.join(data_dir, f"players_{season}.csv"), index_col='player_id'))
+        parquet_path = os.path.join(data_dir, f"{season}.parquet")
+        if os.path.exists(parquet_path):
+            season_dfs.append(pd.read_parquet(parquet_path, columns=profile_columns))
+        else:
+            season_dfs.append(pd.read_csv(os.path.join(data_dir, f"{season}.csv"), usecols=profile_columns))
+    build_pitcher_profiles(season_dfs, os.path.join(data_dir, "pitcher_profiles"), schema.combine_player_names(player_names), prior_counts) # latest season's name
@@ -1,4 +1,13 @@
 import statsapi
+import requests
+import os
+import gzip
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from dataclasses import dataclass
 from typing import List, Tuple, Dict
 
@@ -24,80 +33,164 @@ class AtBat:
     runner_1: bool
     runner_2: bool
     runner_3: bool
+    start_time: str
     pitches: List[Pitch]
 
+## Requests
+retry_errors = (requests.exceptions.RequestException, ConnectionError, TimeoutError) # transport failures; anything else (a bad response, a stub's error) raises at once
+all_star_teams = ['American League All-Stars', 'National League All-Stars']
+
+class RateLimiter:
+    """Space out api requests across worker threads"""
+    def __init__(self, max_per_second=None):
+        self.interval = 1 / max_per_second if max_per_second else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next request slot is free"""
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+def api_request(endpoint, params, api_get=statsapi.get, rate_limiter=None, retries=3, backoff=1.0):
+    """Helper: call the api, retrying transport failures with exponential backoff"""
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            return api_get(endpoint, params)
+        except retry_errors:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2**attempt)
+
+## Raw play-by-play cache
+def get_cache_path(game_id, cache_dir):
+    """Helper: path of a game's cached play-by-play"""
+    return os.path.join(cache_dir, f"{game_id}.json.gz")
+
+def read_cached_game(game_id, cache_dir):
+    """Return a game's cached play-by-play, or None if it isn't cached"""
+    cache_path = get_cache_path(game_id, cache_dir)
+    if not os.path.exists(cache_path):
+        return None
+    with gzip.open(cache_path, "rt") as f:
+        return json.load(f)
+
+def write_cached_game(game_id, play_by_play, cache_dir):
+    """Write a game's play-by-play to the cache"""
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = get_cache_path(game_id, cache_dir)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp" # unique across backfill processes and their fetch threads
+    with gzip.open(tmp_path, "wt") as f:
+        json.dump(play_by_play, f)
+    os.replace(tmp_path, cache_path) # atomic, so a crash never leaves a partial entry
+
 ## Season-Level
-def get_season_data(season):
-    """Get season-level data"""
-    game_ids = get_game_ids(season)
-    season_data = dict()
-    for game_id in game_ids: # loop through games
-        game_data = get_game_data(game_id)
-        season_data[game_id] = game_data
+def get_season_data(season, workers=1, max_per_second=None, cache_dir=None, refresh=False, api_get=statsapi.get):
+    """Get season-level data (reading cached games from cache_dir, if given)"""
+    play_by_plays = iter_season_play_by_play(season, workers, max_per_second, cache_dir, refresh, api_get)
+    season_data = {game_id: parse_game_data(play_by_play) for game_id, play_by_play in play_by_plays}
     return season_data
 
-def get_game_ids(season):
+def iter_season_play_by_play(season, workers=1, max_per_second=None, cache_dir=None, refresh=False, api_get=statsapi.get, rate_limiter=None, skip_game_ids=()):
+    """Yield (game_id, play-by-play) in game_id order, at most 2*workers games in flight"""
+    skip_game_ids = set(skip_game_ids)
+    rate_limiter = rate_limiter or RateLimiter(max_per_second)
+    game_ids = [game_id for game_id in get_game_ids(season, api_get=api_get, rate_limiter=rate_limiter) if game_id not in skip_game_ids]
+    fetch_game = partial(get_play_by_play, api_get=api_get, rate_limiter=rate_limiter, cache_dir=cache_dir, refresh=refresh)
+    if workers <= 1:
+        for game_id in game_ids:
+            yield game_id, fetch_game(game_id)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for game_id in game_ids:
+            in_flight.append((game_id, executor.submit(fetch_game, game_id)))
+            if len(in_flight) >= 2*workers:
+                next_game_id, future = in_flight.popleft()
+                yield next_game_id, future.result()
+        for next_game_id, future in in_flight:
+            yield next_game_id, future.result()
+
+def get_game_ids(season, api_get=statsapi.get, rate_limiter=None):
     """Helper: get game IDs for season"""
-    start_date, end_date = get_season_dates(season)
-    schedule = statsapi.schedule(start_date=start_date, end_date=end_date)
-    schedule = [game for game in schedule if game['home_name'] not in (['American League All-Stars', 'National League All-Stars']) and game['status'] == "Final"]
-    game_ids = list({game['game_id'] for game in schedule})
+    start_date, end_date = get_season_dates(season, api_get=api_get, rate_limiter=rate_limiter)
+    schedule = api_request('schedule', {'startDate':start_date, 'endDate':end_date, 'sportId':1}, api_get=api_get, rate_limiter=rate_limiter) # raw, as statsapi.schedule requests it
+    games = [game for date in schedule.get('dates', []) for game in date['games']]
+    games = [game for game in games if game['teams']['home']['team']['name'] not in all_star_teams and game['status']['detailedState'] == "Final"]
+    game_ids = sorted({game['gamePk'] for game in games})
     return game_ids
 
-def get_season_dates(season):
+def get_season_dates(season, api_get=statsapi.get, rate_limiter=None):
     """Helper: get season start and end dates"""
-    season_dates = statsapi.get('season', {'seasonId':season, 'sportId':1})['seasons'][0]
+    season_dates = api_request('season', {'seasonId':season, 'sportId':1}, api_get=api_get, rate_limiter=rate_limiter)['seasons'][0]
     start_date = season_dates['regularSeasonStartDate']
     end_date = season_dates['regularSeasonEndDate']
     return start_date, end_date
 
 ## Game-Level
-def get_game_data(game_id):
+def get_game_data(game_id, api_get=statsapi.get, rate_limiter=None, cache_dir=None, refresh=False):
     """Get game-level data"""
-    play_by_play = statsapi.get("game_playByPlay", params={'gamePk':game_id})['allPlays']
+    play_by_play = get_play_by_play(game_id, api_get=api_get, rate_limiter=rate_limiter, cache_dir=cache_dir, refresh=refresh)
+    return parse_game_data(play_by_play)
+
+def parse_game_data(play_by_play):
+    """Helper: parse a game's raw play-by-play into AtBats keyed by at bat index"""
     game_data = dict()
-    for at_bat in play_by_play:
+    for at_bat in play_by_play['allPlays']:
         at_bat_data = get_at_bat_data(at_bat)
         at_bat_idx = at_bat['atBatIndex']
         game_data[at_bat_idx] = at_bat_data
     return game_data
 
+def get_play_by_play(game_id, api_get=statsapi.get, rate_limiter=None, cache_dir=None, refresh=False):
+    """Helper: get a game's raw play-by-play, from the cache if available"""
+    if cache_dir is not None and not refresh:
+        play_by_play = read_cached_game(game_id, cache_dir)
+        if play_by_play is not None:
+            return play_by_play
+    play_by_play = api_request("game_playByPlay", {'gamePk':game_id}, api_get=api_get, rate_limiter=rate_limiter)
+    if cache_dir is not None:
+        write_cached_game(game_id, play_by_play, cache_dir)
+    return play_by_play
+
 ## At Bat-Level
 def get_at_bat_data(at_bat):
     """Get at bat-level data"""
+    at_bat_values = get_at_bat_values(at_bat)
+    pitches = get_pitch_data(at_bat)
+    at_bat = AtBat(**at_bat_values, pitches=pitches)
+    return at_bat
+
+def get_at_bat_values(at_bat):
+    """Helper: get at bat-level values (everything but the pitches) keyed by AtBat field"""
     matchup = at_bat['matchup']
-    inning = at_bat['about']['inning']
-    top = at_bat['about']['isTopInning']
-    at_bat_index = at_bat['about']['atBatIndex']
     home_score, away_score = get_score(at_bat) # score going into this at_bat
-    outs = at_bat['playEvents'][0]['count']['outs'] # outs going into this at_bat
-    pitcher_name = matchup['pitcher']['fullName']
-    pitcher_id = matchup['pitcher']['id'] 
-    pitcher_lefty = matchup['pitchHand']['code'] == "L"
-    batter_name = matchup['batter']['fullName']
-    batter_id = matchup['batter']['id']
-    batter_lefty = matchup['batSide']['code'] == "L"
     runner_1, runner_2, runner_3 = get_runners(at_bat)
-    pitches = get_pitch_data(at_bat)
-    at_bat = AtBat(
-        inning,
-        top,
-        at_bat_index,
-        home_score,
-        away_score,
-        outs,
-        pitcher_name,
-        pitcher_id,
-        pitcher_lefty,
-        batter_name,
-        batter_id,
-        batter_lefty,
-        runner_1,
-        runner_2,
-        runner_3,
-        pitches
-    )
-    return at_bat
+    at_bat_values = {
+        'inning': at_bat['about']['inning'],
+        'top': at_bat['about']['isTopInning'],
+        'at_bat_index': at_bat['about']['atBatIndex'],
+        'home_score': home_score,
+        'away_score': away_score,
+        'outs': at_bat['playEvents'][0]['count']['outs'], # outs going into this at_bat
+        'pitcher_name': matchup['pitcher']['fullName'],
+        'pitcher_id': matchup['pitcher']['id'],
+        'pitcher_lefty': matchup['pitchHand']['code'] == "L",
+        'batter_name': matchup['batter']['fullName'],
+        'batter_id': matchup['batter']['id'],
+        'batter_lefty': matchup['batSide']['code'] == "L",
+        'runner_1': runner_1,
+        'runner_2': runner_2,
+        'runner_3': runner_3,
+        'start_time': at_bat['about']['startTime'], # UTC, e.g. 2022-04-07T20:10:34.000Z
+    }
+    return at_bat_values
 
 def get_score(at_bat):
     """Helper: get the score going into a at_bat"""
@@ -121,17 +214,19 @@ def get_runners(at_bat):
 ## Pitch-Level
 def get_pitch_data(at_bat): 
     """Get pitch-level data"""
-    pitches = list()
+    pitches = [Pitch(pitch_type=pitch_type, count=count) for pitch_type, count in iter_pitches(at_bat)]
+    return pitches
+
+def iter_pitches(at_bat):
+    """Helper: yield each pitch's type and the count going into it"""
     count = {'balls': 0, 'strikes': 0}
     for event in at_bat['playEvents']:
         if not event['isPitch']:
             continue
         pitch_details = event['details']
         pitch_type = get_pitch_type(pitch_details)
-        pitch = Pitch(pitch_type=pitch_type, count=count)
-        pitches.append(pitch)
+        yield pitch_type, count
         count = event['count']
-    return pitches
 
 def get_pitch_type(pitch_details):
     """Helper: get pitch type"""
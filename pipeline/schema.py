@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from feature_engineering import pitch_types
+
+## Declared dtypes of every column the pipeline produces, by stage
+count_levels = [f"({balls},{strikes})" for balls in range(4) for strikes in range(3)]
+lag_levels = sorted(pitch_types + ['none'])
+name_columns = {'pitcher_name': 'pitcher_id', 'batter_name': 'batter_id'} # moved to the player lookup table after the raw stage
+
+raw_schema = { # convert_to_dataframe.create_raw_data_frame / iter_raw_data_frames
+    'game_id': 'int32',
+    'inning': 'int8',
+    'top': 'bool',
+    'at_bat_index': 'int16',
+    'home_score': 'int8',
+    'away_score': 'int8',
+    'outs': 'int8',
+    'pitcher_name': 'object',
+    'pitcher_id': 'int32',
+    'pitcher_lefty': 'bool',
+    'batter_name': 'object',
+    'batter_id': 'int32',
+    'batter_lefty': 'bool',
+    'runner_1': 'bool',
+    'runner_2': 'bool',
+    'runner_3': 'bool',
+    'start_time': 'category', # one value per at bat
+    'balls': 'int8',
+    'strikes': 'int8',
+    'pitch_type': 'category', # the api's names, before cleaning
+    'at_bat': 'int16',
+}
+
+features_schema = {column: dtype for column, dtype in raw_schema.items() if column not in name_columns} # feature_engineering.create_features
+features_schema.update({
+    'pitch_type': pd.CategoricalDtype(pitch_types),
+    'raw_pitch_type': 'category',
+    'count': pd.CategoricalDtype(count_levels),
+    'pitch_type_lag_1': pd.CategoricalDtype(lag_levels),
+    'pitch_type_lag_2': pd.CategoricalDtype(lag_levels),
+    **{f"lag_{i}_{outcome}": 'bool' for i in range(1, 4) for outcome in ('ball', 'strike')},
+    'pitch_count': 'int16',
+    'inning_pitch_count': 'int16',
+    'ab_pitch_count': 'int8',
+    **{f"ab_{pitch_type}_count": 'int8' for pitch_type in pitch_types},
+})
+
+rate_columns = [f"{pitch_type}_rate" for pitch_type in pitch_types] # only pitch types thrown that season (or carried over) get a rate
+season_schema = dict(features_schema, nth_season_pitch='int16', **{column: 'float32' for column in rate_columns}) # add_pitch_rates.add_pitcher_pitch_rates
+
+schemas = {'raw': raw_schema, 'features': features_schema, 'season': season_schema}
+
+## Enforcement
+def enforce(df, stage):
+    """Cast df to the stage's declared dtypes"""
+    schema = schemas[stage]
+    undeclared = [column for column in df.columns if column not in schema]
+    missing = [column for column in schema if column not in df.columns and column not in rate_columns]
+    if undeclared or missing:
+        raise ValueError(f"{stage} frame doesn't match its schema (undeclared: {undeclared}, missing: {missing})")
+    dtypes = dict()
+    for column in df.columns:
+        dtype = pd.api.types.pandas_dtype(schema[column])
+        if df[column].dtype == dtype:
+            continue
+        check_fits(df[column], dtype, column)
+        dtypes[column] = dtype
+    return df.astype(dtypes) if dtypes else df
+
+def check_fits(values, dtype, column):
+    """Helper: raise if casting values to dtype would overflow integers or drop categorical values"""
+    if pd.api.types.is_integer_dtype(dtype) and len(values):
+        limits = np.iinfo(dtype)
+        if values.min() < limits.min or values.max() > limits.max:
+            raise ValueError(f"{column} values {values.min()}..{values.max()} don't fit {dtype}")
+    elif isinstance(dtype, pd.CategoricalDtype) and dtype.categories is not None:
+        unknown = set(values.dropna().unique()) - set(dtype.categories)
+        if unknown:
+            raise ValueError(f"{column} has values outside its vocabulary: {sorted(map(str, unknown))}")
+
+## Player names
+def split_player_names(df):
+    """Move pitcher and batter names out of a raw frame into a lookup table (player_id -> name)"""
+    names = pd.concat([df[[id_column, name_column]].set_axis(['player_id', 'name'], axis=1) for name_column, id_column in name_columns.items()])
+    return df.drop(columns=list(name_columns)), combine_player_names([names.set_index('player_id')])
+
+def combine_player_names(player_names):
+    """Helper: one lookup table from several, keeping each player's last name seen"""
+    names = pd.concat(player_names)
+    return names[~names.index.duplicated(keep='last')].sort_index()
+
+## Memory
+def get_memory_report(df):
+    """Each column's dtype and memory (MB, including strings), largest first, with a total row"""
+    memory = df.memory_usage(index=False, deep=True) / 2**20
+    report = pd.DataFrame({'dtype': df.dtypes.astype(str), 'mb': memory}).sort_values('mb', ascending=False)
+    report.loc['total'] = ["", memory.sum()]
+    return report
@@ -0,0 +1,79 @@
+import numpy as np
+import pull_from_api
+from datetime import datetime, timedelta
+
+## Synthetic api responses for benchmarks (no network)
+raw_pitch_types = ['Four-Seam Fastball', 'Slider', 'Sinker', 'Changeup', 'Curveball', 'Cutter', 'Knuckle Curve', 'Splitter', 'Eephus', None]
+raw_pitch_type_probs = [0.32, 0.17, 0.15, 0.11, 0.08, 0.07, 0.05, 0.03, 0.01, 0.01]
+
+def get_synthetic_play_by_play(game_id, n_pitchers=400, n_batters=600):
+    """Create a fake game_playByPlay response shaped like the api's"""
+    rng = np.random.default_rng(game_id)
+    first_pitch = datetime(2022, 4, 7, 23, 5) + timedelta(days=(game_id - 1) // 15) # 15 games a day
+    plays = list()
+    home_score, away_score = 0, 0
+    at_bat_index = 0
+    for inning in range(1, 10):
+        for top in (True, False):
+            pitcher_id = int(rng.integers(n_pitchers)) + 1
+            outs = 0
+            while outs < 3:
+                batter_id = int(rng.integers(n_pitchers, n_pitchers + n_batters)) + 1
+                play_events = get_synthetic_play_events(rng, outs)
+                runners = [
+                    {'movement': {'originBase': base, 'end': "score" if rng.random() < 0.1 else None}}
+                    for base in ("1B", "2B", "3B") if rng.random() < 0.25
+                ]
+                runs = sum(runner['movement']['end'] == "score" for runner in runners)
+                if top:
+                    away_score += runs
+                else:
+                    home_score += runs
+                plays.append({
+                    'atBatIndex': at_bat_index,
+                    'about': {'inning': inning, 'isTopInning': top, 'atBatIndex': at_bat_index, 'startTime': f"{first_pitch + timedelta(minutes=3*at_bat_index):%Y-%m-%dT%H:%M:%S}.000Z"},
+                    'matchup': {
+                        'pitcher': {'fullName': f"Pitcher {pitcher_id}", 'id': pitcher_id},
+                        'pitchHand': {'code': "L" if pitcher_id % 4 == 0 else "R"},
+                        'batter': {'fullName': f"Batter {batter_id}", 'id': batter_id},
+                        'batSide': {'code': "L" if batter_id % 3 == 0 else "R"},
+                    },
+                    'result': {'homeScore': home_score, 'awayScore': away_score},
+                    'runners': runners,
+                    'playEvents': play_events,
+                })
+                at_bat_index += 1
+                outs += 1 if rng.random() < 0.7 else 0
+    return {'allPlays': plays}
+
+def get_synthetic_play_events(rng, outs):
+    """Helper: fake pitches (and the odd non-pitch event) for one at bat"""
+    play_events = list()
+    balls, strikes = 0, 0
+    while balls < 4 and strikes < 3:
+        if rng.random() < 0.03:
+            play_events.append({'isPitch': False, 'details': {'description': "Pickoff Attempt 1B"}, 'count': {'balls': balls, 'strikes': strikes, 'outs': outs}})
+        pitch_type = raw_pitch_types[rng.choice(len(raw_pitch_types), p=raw_pitch_type_probs)]
+        details = {'description': "Ball"}
+        if pitch_type is not None:
+            details['type'] = {'description': pitch_type}
+        if rng.random() < 0.45:
+            balls += 1
+        else:
+            strikes += 1
+        play_events.append({'isPitch': True, 'details': details, 'count': {'balls': balls, 'strikes': strikes, 'outs': outs}})
+        if rng.random() < 0.2: # ball in play
+            break
+    return play_events
+
+def synthetic_api_get(endpoint, params):
+    """Stand-in for statsapi.get serving synthetic play-by-play"""
+    if endpoint != "game_playByPlay":
+        raise ValueError(f"synthetic api only serves game_playByPlay, not {endpoint}")
+    return get_synthetic_play_by_play(params['gamePk'])
+
+def get_synthetic_season_data(n_games=2430, first_game_id=1):
+    """Build season_data (as from pull_from_api.get_season_data) for n_games synthetic games"""
+    game_ids = range(first_game_id, first_game_id + n_games)
+    season_data = {game_id: pull_from_api.get_game_data(game_id, api_get=synthetic_api_get) for game_id in game_ids}
+    return season_data
@@ -0,0 +1,21 @@
+import os
+import sys
+import pandas as pd
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([root_dir, os.path.join(root_dir, "pipeline")])
+import synthetic, convert_to_dataframe
+from pipeline import benchmark
+
+def test_raw_frame_matches_reference():
+    season_data = synthetic.get_synthetic_season_data(8)
+    raw_df = convert_to_dataframe.create_raw_data_frame(season_data)
+    reference_df = benchmark.reference_create_raw_data_frame(season_data)
+    pd.testing.assert_frame_equal(raw_df.astype(object), reference_df.astype(object))
+
+def test_batched_raw_frames_match_whole_season():
+    season_data = synthetic.get_synthetic_season_data(12)
+    play_by_plays = ((game_id, synthetic.get_synthetic_play_by_play(game_id)) for game_id in season_data)
+    batches = list(convert_to_dataframe.iter_raw_data_frames(play_by_plays, 500))
+    assert len(batches) > 1
+    raw_df = convert_to_dataframe.create_raw_data_frame(season_data)
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), raw_df)
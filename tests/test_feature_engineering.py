@@ -0,0 +1,18 @@
+import os
+import sys
+import pandas as pd
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.extend([root_dir, os.path.join(root_dir, "pipeline")])
+import synthetic, convert_to_dataframe, feature_engineering
+from pipeline import benchmark
+
+def test_features_match_reference():
+    raw_df = benchmark.stack_seasons(convert_to_dataframe.create_raw_data_frame(synthetic.get_synthetic_season_data(10)), 2)
+    features_df = feature_engineering.create_features(raw_df.copy())
+    pd.testing.assert_frame_equal(features_df, benchmark.reference_create_features(raw_df.copy()))
+
+def test_features_by_game_batch_match_whole_season():
+    raw_df = convert_to_dataframe.create_raw_data_frame(synthetic.get_synthetic_season_data(10))
+    features_df = feature_engineering.create_features(raw_df.copy())
+    batches = [feature_engineering.create_features(raw_df[raw_df['game_id'].isin(game_ids)].reset_index(drop=True)) for game_ids in ([1, 2, 3], [4, 5, 6, 7], [8, 9, 10])]
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), features_df)
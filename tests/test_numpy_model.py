@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import numpy as np
+import pytest
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(root_dir, "model"))
+import numpy_model
+
+keras = pytest.importorskip("tensorflow").keras
+model_path = os.path.join(root_dir, "model/saved_models/fit_model_simple.h5")
+
+@pytest.fixture(scope="module")
+def models(tmp_path_factory):
+    """The shipped Keras model and its NumPy export"""
+    npz_path = str(tmp_path_factory.mktemp("numpy_model") / "fit_model_simple.npz")
+    numpy_model.export_weights(model_path, npz_path)
+    return keras.models.load_model(model_path), numpy_model.NumpyModel(npz_path)
+
+def get_inputs(keras_model, n_rows=10_000):
+    """Helper: random standardized inputs of the model's width"""
+    return np.random.default_rng(0).normal(size=(n_rows, keras_model.input_shape[1])).astype(np.float32)
+
+def test_numpy_matches_keras(models):
+    keras_model, numpy_model = models
+    X = get_inputs(keras_model)
+    keras_probs, numpy_probs = keras_model.predict(X, batch_size=4096, verbose=0), numpy_model.predict(X)
+    np.testing.assert_allclose(numpy_probs, keras_probs, rtol=0, atol=1e-4)
+    assert (numpy_probs.argmax(axis=1) == keras_probs.argmax(axis=1)).mean() > 0.999
+    np.testing.assert_allclose(numpy_model.predict(X[0]), keras_probs[:1], rtol=0, atol=1e-4) # single rows, as the app scores them
+
+def test_numpy_single_row_is_faster_than_keras(models):
+    keras_model, numpy_model = models
+    x = get_inputs(keras_model, 1)
+    def best_ms(predict, repeat=20):
+        """Helper: best of repeat single-row predictions, after a warm-up call"""
+        predict(x)
+        times = list()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            predict(x)
+            times.append(time.perf_counter() - start)
+        return 1000 * min(times)
+    assert best_ms(numpy_model.predict) < best_ms(lambda x: keras_model(x, training=False).numpy())
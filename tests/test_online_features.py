@@ -0,0 +1,52 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline"))
+import synthetic, convert_to_dataframe, feature_engineering, add_pitch_rates, online_features
+
+min_pitches = 5 # low, so most synthetic pitchers get rates
+
+def get_raw_season(n_games=20, first_game_id=1):
+    """Helper: raw dataframe of a synthetic season"""
+    return convert_to_dataframe.create_raw_data_frame(synthetic.get_synthetic_season_data(n_games, first_game_id))
+
+def get_batch_frame(raw_df, prior_counts=None):
+    """Helper: the batch pipeline's season frame, with dummies as model/fit.get_dummies makes them"""
+    batch_df = add_pitch_rates.add_pitcher_pitch_rates(feature_engineering.create_features(raw_df.copy()), min_pitches, prior_counts)
+    return batch_df.join(pd.get_dummies(batch_df[['count', 'pitch_type_lag_1', 'pitch_type_lag_2']], prefix=['count', 'lag_1', 'lag_2']))
+
+def get_feature_names(batch_df):
+    """Helper: every online feature the batch pipeline also makes"""
+    return [name for name in online_features.get_feature_names() if name in batch_df.columns]
+
+def test_replayed_season_matches_batch_pipeline():
+    raw_df = get_raw_season()
+    batch_df = get_batch_frame(raw_df)
+    feature_names = get_feature_names(batch_df)
+    online_X = online_features.replay_season(raw_df, feature_names, min_pitches=min_pitches)
+    batch_X = batch_df[feature_names].astype(float).to_numpy()
+    assert np.isfinite(online_X).all(axis=1).mean() > 0.5
+    np.testing.assert_array_equal(online_X, batch_X)
+
+def test_features_before_update_matches_batch_pipeline():
+    raw_df = get_raw_season(6)
+    batch_df = get_batch_frame(raw_df)
+    feature_names = get_feature_names(batch_df)
+    features = online_features.OnlineFeatures(feature_names, min_pitches=min_pitches)
+    rows = list()
+    for pitch in raw_df.to_dict('records'):
+        rows.append(features.features(dict(pitch, pitch_type=None))) # the pitch isn't thrown yet
+        features.update(pitch['pitch_type'], pitch['game_id'])
+    np.testing.assert_array_equal(np.vstack(rows), batch_df[feature_names].astype(float).to_numpy())
+
+def test_loaded_counts_match_carried_rates():
+    last_season = get_raw_season(10)
+    prior_counts = add_pitch_rates.get_pitcher_pitch_counts(feature_engineering.create_features(last_season.copy()))
+    raw_df = get_raw_season(5, first_game_id=11)
+    batch_df = get_batch_frame(raw_df, prior_counts)
+    feature_names = get_feature_names(batch_df)
+    features = online_features.OnlineFeatures(feature_names, min_pitches=min_pitches)
+    features.load_counts(prior_counts)
+    online_X = np.vstack([features.ingest(pitch) for pitch in raw_df.to_dict('records')])
+    np.testing.assert_array_equal(online_X, batch_df[feature_names].astype(float).to_numpy())
@@ -0,0 +1,39 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline"))
+import synthetic, convert_to_dataframe, feature_engineering, add_pitch_rates, schema, pitcher_profiles
+
+min_pitches = 5
+
+def get_season(n_games=20):
+    """Helper: season frame of synthetic games a day apart, and its player names"""
+    raw_df, player_names = schema.split_player_names(convert_to_dataframe.create_raw_data_frame(synthetic.get_synthetic_season_data(n_games)))
+    raw_df['start_time'] = (pd.Timestamp("2022-04-07T23:05:00") + pd.to_timedelta(raw_df['game_id'], unit='D')).dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    return add_pitch_rates.add_pitcher_pitch_rates(feature_engineering.create_features(raw_df), min_pitches), player_names
+
+def test_rates_as_of_a_game_count_every_earlier_pitch(tmp_path):
+    season_df, player_names = get_season()
+    pitcher_profiles.build_pitcher_profiles([season_df], str(tmp_path), player_names, min_pitches=min_pitches)
+    profiles = pitcher_profiles.PitcherProfiles(str(tmp_path))
+    first_pitches = season_df.drop_duplicates(['pitcher_id', 'game_id']) # rates going into each game count every pitch before it
+    checked = 0
+    for pitch in first_pitches.to_dict('records'):
+        expected = np.array([pitch.get(column, 0) for column in pitcher_profiles.rate_columns], dtype=np.float32)
+        rates = profiles.get_rates(pitch['pitcher_id'], as_of=pitch['start_time'][:19])
+        if np.isnan(pitch['fastball_rate']):
+            assert np.isnan(rates).all()
+        else:
+            np.testing.assert_allclose(rates, np.nan_to_num(expected), rtol=1e-6)
+            checked += 1
+    assert checked > 100
+
+def test_latest_rates_include_the_last_pitch(tmp_path):
+    season_df, player_names = get_season()
+    pitcher_profiles.build_pitcher_profiles([season_df], str(tmp_path), player_names, min_pitches=min_pitches)
+    profiles = pitcher_profiles.PitcherProfiles(str(tmp_path))
+    counts = add_pitch_rates.get_pitcher_pitch_counts(season_df).reindex(columns=pitcher_profiles.pitch_types, fill_value=0)
+    for pitcher_id, row in counts.iterrows():
+        if row.sum() >= min_pitches:
+            np.testing.assert_allclose(profiles.get_rates(pitcher_id), row.to_numpy() / row.sum(), rtol=1e-6)
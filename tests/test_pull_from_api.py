@@ -0,0 +1,68 @@
+import os
+import sys
+import pytest
+import requests
+import statsapi
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline"))
+import pull_from_api, synthetic
+
+class StubApi:
+    """Stand-in for statsapi.get serving a small synthetic season, failing chosen requests once"""
+    def __init__(self, n_games=6, flaky_game_ids=()):
+        self.game_ids = list(range(1, n_games + 1))
+        self.flaky_game_ids = set(flaky_game_ids)
+        self.requests = list()
+
+    def __call__(self, endpoint, params):
+        self.requests.append((endpoint, dict(params)))
+        if endpoint == "season":
+            return {'seasons': [{'regularSeasonStartDate': "2022-04-07", 'regularSeasonEndDate': "2022-10-05"}]}
+        if endpoint == "schedule":
+            games = [{'gamePk': game_id, 'status': {'detailedState': "Final"}, 'teams': {'home': {'team': {'name': "Home"}}}} for game_id in self.game_ids]
+            games.append({'gamePk': 999, 'status': {'detailedState': "Final"}, 'teams': {'home': {'team': {'name': "American League All-Stars"}}}})
+            games.append({'gamePk': 998, 'status': {'detailedState': "Postponed"}, 'teams': {'home': {'team': {'name': "Home"}}}})
+            return {'dates': [{'games': games[::-1]}]}
+        if endpoint == "game_playByPlay":
+            if params['gamePk'] in self.flaky_game_ids:
+                self.flaky_game_ids.remove(params['gamePk'])
+                raise requests.exceptions.ConnectionError("stub connection reset")
+            return synthetic.get_synthetic_play_by_play(params['gamePk'])
+        raise ValueError(f"stub doesn't serve {endpoint}")
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    """Fail any request that doesn't go through the stub"""
+    def fail(*args, **kwargs):
+        raise AssertionError("request bypassed the stub")
+    monkeypatch.setattr(statsapi, "get", fail)
+    monkeypatch.setattr(statsapi, "schedule", fail)
+    monkeypatch.setattr(requests, "get", fail)
+
+def test_season_fetch_uses_only_the_stub():
+    stub = StubApi()
+    season_data = pull_from_api.get_season_data(2022, api_get=stub)
+    assert list(season_data) == stub.game_ids
+    assert {endpoint for endpoint, _ in stub.requests} == {"season", "schedule", "game_playByPlay"}
+
+def test_concurrent_fetch_matches_serial_and_retries_transport_errors(monkeypatch):
+    monkeypatch.setattr(pull_from_api.time, "sleep", lambda seconds: None)
+    serial = pull_from_api.get_season_data(2022, workers=1, api_get=StubApi())
+    stub = StubApi(flaky_game_ids=[2, 5])
+    concurrent = pull_from_api.get_season_data(2022, workers=4, api_get=stub)
+    assert list(concurrent) == list(serial)
+    assert concurrent == serial
+    assert sum(endpoint == "game_playByPlay" for endpoint, _ in stub.requests) == len(stub.game_ids) + 2
+
+def test_other_errors_are_not_retried(monkeypatch):
+    sleeps = list()
+    monkeypatch.setattr(pull_from_api.time, "sleep", sleeps.append)
+    stub = StubApi()
+    with pytest.raises(ValueError):
+        pull_from_api.api_request("teams", {}, api_get=stub)
+    assert len(stub.requests) == 1 and sleeps == []
+
+def test_cached_games_are_not_refetched(tmp_path):
+    pull_from_api.get_season_data(2022, cache_dir=str(tmp_path), api_get=StubApi())
+    stub = StubApi()
+    pull_from_api.get_season_data(2022, cache_dir=str(tmp_path), api_get=stub)
+    assert all(endpoint != "game_playByPlay" for endpoint, _ in stub.requests)
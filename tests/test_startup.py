@@ -0,0 +1,12 @@
+import os
+import sys
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(root_dir, "app"))
+import startup
+
+def test_headless_first_prediction():
+    """A fresh interpreter reaches its first prediction and chart on the NumPy model, without Streamlit"""
+    report = startup.measure_cold_start(headless_backend="numpy")
+    events = report['events']
+    assert events['model_loaded'] <= events['first_prediction'] <= events['first_chart']
+    assert not any(name.startswith("tensorflow") or name.startswith("streamlit") for name in report['imports'])